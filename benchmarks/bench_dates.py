@@ -0,0 +1,63 @@
+"""Micro-benchmark of parsing the timestamps of the APIs.
+
+Compares dateutil, which the client used before, with parseDate, with and
+without its cache, on a few thousand timestamps shaped like those of
+fbs-openplatform and pubhub:
+
+    python -m benchmarks.bench_dates --records 5000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+
+from dateutil import parser
+
+from .bench_update import load_api
+
+
+def timestamps(records: int):
+    # Dates, local timestamps with an offset and UTC timestamps, with the repeats of real accounts
+    random.seed(1)
+    values = []
+    for _ in range(records):
+        day = f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}"
+        values.append(random.choice((
+            day,
+            f"{day}T{random.randint(0, 23):02d}:{random.randint(0, 59):02d}:00+02:00",
+            f"{day}T{random.randint(0, 23):02d}:{random.randint(0, 59):02d}:00Z",
+        )))
+    return values
+
+
+def main():
+    argParser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--records", type=int, default=5000)
+    argParser.add_argument("--repeat", type=int, default=5)
+    args = argParser.parse_args()
+    (dates,) = load_api("dates")
+    values = timestamps(args.records)
+
+    def withDateutil():
+        for value in values:
+            parser.parse(value, ignoretz=True)
+
+    def withParseDate():
+        dates.parseDate.cache_clear()
+        for value in values:
+            dates.parseDate(value)
+
+    def withParseDateWarm():
+        for value in values:
+            dates.parseDate(value)
+
+    for name, function in (
+        ("dateutil", withDateutil), ("parseDate", withParseDate), ("parseDate, cached", withParseDateWarm),
+    ):
+        seconds = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        print(f"{name:>20}  {seconds * 1000:8.2f} ms  {seconds / len(values) * 1e6:6.2f} us/record")
+
+
+if __name__ == "__main__":
+    main()
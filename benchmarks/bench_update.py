@@ -0,0 +1,132 @@
+"""Benchmark of a full update() of many accounts against the local stand-in.
+
+update() refreshes every category through refresh(), the path the
+coordinators of Home Assistant take, so the benchmark measures that path.
+
+For every combination of loans and accounts, a fresh stand-in is started in a
+child process and all the accounts are updated at the same time, first with
+an empty metadata cache (cold) and then once more (warm). The wall time, the
+requests sent and the peak memory of the client are reported, so releases can
+be compared:
+
+    python -m benchmarks.bench_update --loans 1 50 500 --accounts 1 10 100 --json results.json
+
+Needs aiohttp, beautifulsoup4 and python-dateutil, but not Home Assistant.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import argparse
+import asyncio
+import importlib
+import json
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+ROOT = Path(__file__).resolve().parent.parent
+INTEGRATION = ROOT / "custom_components" / "bibliotek_dk"
+AGENCY = "775100"
+# Loans of materials the catalogue does not know, and eReolen loans, of every account
+UNKNOWN = 1
+ELOANS = 2
+
+
+def load_api(*names):
+    # The API layer does not use Home Assistant, so it is loaded without the __init__ of the integration
+    package = types.ModuleType("bibliotek_dk")
+    package.__path__ = [str(INTEGRATION)]
+    sys.modules.setdefault("bibliotek_dk", package)
+    return [importlib.import_module(f"bibliotek_dk.{name}") for name in names]
+
+
+def _freePort():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _waitFor(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(loans: int, accounts: int, latency: float, padding: int):
+    library_api, transport, cache, branches = load_api("library_api", "transport", "cache", "branches")
+    port = _freePort()
+    # The stand-in runs in its own process, so it does not count in the time and memory of the client
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_server", "--port", str(port),
+            "--loans", str(loans), "--reservations", str(max(loans // 5, 1)), "--unknown", str(UNKNOWN),
+            "--latency", str(latency), "--padding", str(padding),
+        ],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        await _waitFor(port)
+        baseUrl = f"http://127.0.0.1:{port}"
+        tracemalloc.start()
+        # No rate limit, the benchmark measures the client and not the limiter
+        pool = transport.LibraryTransport(baseUrl=baseUrl, ratePerHost=1e9, rateBurst=10**9)
+        shared = cache.MetadataCache()
+        directory = branches.BranchDirectory(AGENCY, shared)
+        libraries = [
+            library_api.AsyncLibrary(
+                pool, f"0101{n:06d}", "1234", baseUrl, AGENCY, cache=shared, branches=directory,
+            )
+            for n in range(accounts)
+        ]
+        result = {"loans": loans, "accounts": accounts}
+        for phase in ("cold", "warm"):
+            before = sum(library.metrics.requests for library in libraries)
+            start = time.perf_counter()
+            await asyncio.gather(*(library.update() for library in libraries))
+            result[f"{phase}_seconds"] = round(time.perf_counter() - start, 3)
+            result[f"{phase}_requests"] = sum(library.metrics.requests for library in libraries) - before
+        result["peak_mib"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+        assert all(len(library.user.loans) == loans + UNKNOWN + ELOANS for library in libraries), "not every loan was parsed"
+        for library in libraries:
+            await library.close()
+        await pool.close()
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loans", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--latency", type=float, default=20, help="milliseconds added to every answer")
+    parser.add_argument("--padding", type=int, default=0, help="characters added to every material")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    columns = ("loans", "accounts", "cold_seconds", "cold_requests", "warm_seconds", "warm_requests", "peak_mib")
+    print("  ".join(f"{column:>13}" for column in columns))
+    results = []
+    for loans in args.loans:
+        for accounts in args.accounts:
+            result = asyncio.run(run(loans, accounts, args.latency, args.padding))
+            results.append(result)
+            print("  ".join(f"{result[column]:>13}" for column in columns), flush=True)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
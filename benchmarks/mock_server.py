@@ -0,0 +1,244 @@
+"""A local stand-in for the library servers, used by the benchmarks.
+
+It answers the login form, the tokens and urls of the library website, the
+patron, loans, reservations and fees of fbs-openplatform, the loans,
+reservations and products of pubhub and the FBI and bibliotek.dk GraphQL
+endpoints, with generated data. Every account gets the same materials,
+including loans of materials the catalogue does not know.
+
+Run it on its own with
+
+    python -m benchmarks.mock_server --port 8080 --loans 50 --latency 20
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import argparse
+import asyncio
+
+from aiohttp import web
+
+FBI_URL = "https://fbi-api.dbc.dk/next-present/graphql"
+# The FAUST ids from here on are not known by the catalogue
+UNKNOWN_FAUST = 90000000
+
+
+@dataclass
+class MockConfig:
+    loans: int = 10
+    # Loans of unknown materials, due the same day as the first loan
+    unknown: int = 1
+    reservations: int = 10
+    reservationsReady: int = 2
+    debts: int = 1
+    eLoans: int = 2
+    eReservations: int = 2
+    branches: int = 30
+    # Milliseconds added to every answer, and characters added to every material
+    latency: float = 0
+    padding: int = 0
+
+
+def _faust(n):
+    return f"{50000000 + n}"
+
+
+def _manifestation(faust, padding):
+    if int(faust) >= UNKNOWN_FAUST:
+        return None
+    return {
+        "pid": f"870970-basis:{faust}",
+        "titles": {"main": [f"Titel {faust}"], "full": [f"Titel {faust}: En roman"]},
+        "creators": [{"display": f"Forfatter {faust}"}],
+        "materialTypes": [{"materialTypeSpecific": {"display": "bog"}}],
+        "cover": {"thumbnail": f"https://moreinfo.addi.dk/{faust}.jpg"},
+        "abstract": ["x" * padding] if padding else [],
+    }
+
+
+class MockLibrary:
+    """The handlers of the stand-in, counting the requests it answered."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.requests = 0
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.requests += 1
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency / 1000)
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/login", self.loginPage)
+        app.router.add_post("/login", self.login)
+        app.router.add_get("/dpl-react/user-tokens", self.userTokens)
+        app.router.add_get("/user/me/loans", self.urls)
+        app.router.add_get("/logout", self.logout)
+        app.router.add_get("/external/agencyid/patrons/patronid/v4", self.patron)
+        app.router.add_get("/external/agencyid/patrons/patronid/loans/v2", self.loans)
+        app.router.add_get("/external/v1/agencyid/patrons/patronid/reservations/v2", self.reservations)
+        app.router.add_get("/external/agencyid/patron/patronid/fees/v2", self.fees)
+        app.router.add_get("/v1/user/loans", self.eLoans)
+        app.router.add_get("/v1/user/reservations", self.eReservations)
+        app.router.add_get("/v1/products/{id}", self.product)
+        app.router.add_post("/next-present/graphql", self.details)
+        app.router.add_post("/api/bibdk21/graphql", self.branches)
+        return app
+
+    async def loginPage(self, request):
+        return web.Response(content_type="text/html", text=(
+            '<html><body><form action="/login" method="post">'
+            '<input name="loginBibDkUserId" value=""/>'
+            '<input name="pincode" value=""/>'
+            '<input name="form_id" value="user_login"/>'
+            '</form></body></html>'
+        ))
+
+    async def login(self, request):
+        await request.post()
+        return web.Response(content_type="text/html", text="<html>logged in</html>")
+
+    async def userTokens(self, request):
+        return web.Response(
+            content_type="application/javascript",
+            text='window.dplReact.setToken("library", "library-token");\nwindow.dplReact.setToken("user", "user-token");',
+        )
+
+    async def urls(self, request):
+        return web.Response(content_type="text/html", text=(
+            f'<div data-fbi-global-base-url="{FBI_URL}" data-fbs-base-url="https://fbs-openplatform.dbc.dk"></div>'
+        ))
+
+    async def logout(self, request):
+        return web.Response(text="")
+
+    async def patron(self, request):
+        return web.json_response({"patron": {
+            "name": "Bente Bog",
+            "address": {"street": "Bibliotekvej 1", "postalCode": "5000", "city": "Odense"},
+            "phoneNumber": "12345678",
+            "receiveSms": True,
+            "emailAddress": "bente@example.com",
+            "receiveEmail": True,
+            "preferredPickupBranch": "DK-775100",
+        }})
+
+    async def loans(self, request):
+        return web.json_response([
+            {
+                "isRenewable": n % 2 == 0,
+                "loanDetails": {
+                    "recordId": _faust(n) if n < self.config.loans else f"{UNKNOWN_FAUST + n}",
+                    "loanId": 1000 + n,
+                    "loanDate": "2024-05-01T12:00:00+02:00",
+                    "dueDate": f"2099-06-{1 + n % 28:02d}" if n < self.config.loans else "2099-06-01",
+                    "materialItemNumber": f"item-{n}",
+                },
+            }
+            for n in range(self.config.loans + self.config.unknown)
+        ])
+
+    async def reservations(self, request):
+        reservations = []
+        for n in range(self.config.reservations + self.config.reservationsReady):
+            ready = n < self.config.reservationsReady
+            reservations.append({
+                "transactionId": f"t{n}",
+                "recordId": _faust(10000 + n),
+                "state": "readyForPickup" if ready else "reserved",
+                "dateOfReservation": "2024-04-01T10:00:00+02:00",
+                "pickupBranch": f"DK-7751{n % self.config.branches:02d}",
+                "pickupNumber": f"{n}-1" if ready else None,
+                "pickupDeadline": "2099-05-20" if ready else None,
+                "expiryDate": "2099-12-31",
+                "numberInQueue": n + 1,
+            })
+        return web.json_response(reservations)
+
+    async def fees(self, request):
+        return web.json_response([
+            {
+                "creationDate": "2024-03-01",
+                "dueDate": "2099-04-01",
+                "amount": 20.0,
+                "materials": [{"recordId": _faust(20000 + n)}],
+            }
+            for n in range(self.config.debts)
+        ])
+
+    async def eLoans(self, request):
+        return web.json_response({
+            "userData": {"totalEbookLoans": self.config.eLoans, "totalAudioLoans": 0},
+            "libraryData": {"maxConcurrentEbookLoansPerBorrower": 5, "maxConcurrentAudiobookLoansPerBorrower": 5},
+            "loans": [
+                {
+                    "libraryBook": {"identifier": f"97887{n:08d}"},
+                    "orderDateUtc": "2024-05-01T10:00:00Z",
+                    "orderId": f"order-{n}",
+                    "loanExpireDateUtc": "2099-05-31T10:00:00Z",
+                }
+                for n in range(self.config.eLoans)
+            ],
+        })
+
+    async def eReservations(self, request):
+        return web.json_response({"reservations": [
+            {
+                "identifier": f"97888{n:08d}",
+                "expectedRedeemDateUtc": "2099-07-01T10:00:00Z",
+                "createdDateUtc": "2024-05-01T10:00:00Z",
+            }
+            for n in range(self.config.eReservations)
+        ]})
+
+    async def product(self, request):
+        return web.json_response({"product": {
+            "title": f"E-bog {request.match_info['id']}",
+            "thumbnailUri": f"https://images.pubhub.dk/{request.match_info['id']}.jpg",
+            "contributors": [{"firstName": "Erik ", "lastName": "Ebog"}],
+            "format": "ebook",
+            "description": "x" * self.config.padding,
+        }})
+
+    async def details(self, request):
+        # The single lookup uses $faust, the batches $faust0, $faust1, ... answered as m0, m1, ...
+        variables = (await request.json())["variables"]
+        if "faust" in variables:
+            data = {"manifestation": _manifestation(variables["faust"], self.config.padding)}
+        else:
+            data = {
+                f"m{name[len('faust'):]}": _manifestation(faust, self.config.padding)
+                for name, faust in variables.items()
+            }
+        return web.json_response({"data": data})
+
+    async def branches(self, request):
+        variables = (await request.json())["variables"]
+        offset, limit = variables["offset"], variables["limit"]
+        result = [
+            {"branchId": f"DK-7751{n:02d}", "name": f"Filial {n}"}
+            for n in range(offset, min(offset + limit, self.config.branches))
+        ]
+        return web.json_response({"data": {"branches": {"hitcount": self.config.branches, "result": result}}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--loans", type=int, default=MockConfig.loans)
+    parser.add_argument("--reservations", type=int, default=MockConfig.reservations)
+    parser.add_argument("--unknown", type=int, default=MockConfig.unknown, help="loans of materials the catalogue does not know")
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds added to every answer")
+    parser.add_argument("--padding", type=int, default=0, help="characters added to every material")
+    args = parser.parse_args()
+    config = MockConfig(
+        loans=args.loans, reservations=args.reservations, unknown=args.unknown, latency=args.latency, padding=args.padding,
+    )
+    web.run_app(MockLibrary(config).app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
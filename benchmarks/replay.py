@@ -0,0 +1,96 @@
+"""Record a real session into a cassette, and replay it offline.
+
+Recording logs in with a real account, runs one update() and saves the
+answers with the CPR number, pincode and tokens scrubbed. Names, addresses
+and the materials are kept, so pass more --scrub values before sharing it:
+
+    python -m benchmarks.replay record session.json --user 0101011234 --pincode 1234 --host https://fmbib.dk --agency 748000
+
+Replaying runs update() against the cassette and then times fetchLoans,
+fetchReservations and fetchDebts on the recorded answers, with the requests
+each of them sent. A request missing from the cassette, like a new lookup per
+material, is listed at the end and fails the run:
+
+    python -m benchmarks.replay replay session.json --latency 0.05 --rounds 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+
+from .bench_update import load_api
+
+# The scrubbed account used for replaying
+REPLAY_USER = "0000000000"
+REPLAY_PINCODE = "0000"
+
+
+async def record(args):
+    library_api, cassette = load_api("library_api", "cassette")
+    tape = cassette.Cassette(
+        secrets=[args.user, args.pincode, *args.scrub], meta={'host': args.host, 'agency': args.agency},
+    )
+    transport = cassette.RecordingTransport(tape)
+    library = library_api.AsyncLibrary(transport, args.user, args.pincode, args.host, args.agency)
+    try:
+        await library.update()
+    finally:
+        await library.close()
+        await transport.close()
+    tape.save(args.cassette)
+    print(f"Recorded {len(tape.interactions)} answers into {args.cassette}")
+
+
+async def replay(args):
+    library_api, cassette = load_api("library_api", "cassette")
+    tape = cassette.Cassette.load(args.cassette)
+    transport = cassette.ReplayTransport(tape, latency=args.latency)
+    library = library_api.AsyncLibrary(
+        transport, REPLAY_USER, REPLAY_PINCODE, tape.meta['host'], tape.meta['agency'],
+    )
+    try:
+        start = time.perf_counter()
+        await library.update()
+        print(f"{'update':>20}  {time.perf_counter() - start:8.4f}s  {library.metrics.requests:4d} requests")
+        for name in ("fetchLoans", "fetchReservations", "fetchDebts"):
+            before = library.metrics.requests
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                await getattr(library, name)()
+            seconds = (time.perf_counter() - start) / args.rounds
+            requests = (library.metrics.requests - before) / args.rounds
+            print(f"{name:>20}  {seconds:8.4f}s  {requests:4.0f} requests")
+    finally:
+        await library.close()
+        await transport.close()
+    print(f"{len(library.user.loans)} loans, {len(library.user.reservations)} reservations, {len(library.user.debts)} debts")
+    for key in dict.fromkeys(transport.unmatched):
+        print(f"Not in the cassette: {key}")
+    return 1 if transport.unmatched else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    recorder = commands.add_parser("record")
+    recorder.add_argument("cassette")
+    recorder.add_argument("--user", required=True, help="CPR number or loan number")
+    recorder.add_argument("--pincode", required=True)
+    recorder.add_argument("--host", required=True, help="the website of the library, like https://fmbib.dk")
+    recorder.add_argument("--agency", required=True)
+    recorder.add_argument("--scrub", nargs="*", default=[], help="more values to remove, like a name or address")
+    player = commands.add_parser("replay")
+    player.add_argument("cassette")
+    player.add_argument("--latency", type=float, default=0, help="seconds added to every answer")
+    player.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    if args.command == "record":
+        asyncio.run(record(args))
+    else:
+        sys.exit(asyncio.run(replay(args)))
+
+
+if __name__ == "__main__":
+    main()
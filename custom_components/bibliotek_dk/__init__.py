@@ -1,36 +1,108 @@
 """The Dummy Garage integration."""
 from __future__ import annotations
 
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE, Platform
+from homeassistant.core import Event, HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse, callback
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.typing import ConfigType
+from homeassistant.util.ssl import get_default_context
 
-from .library_api import Library
+from .branches import BranchDirectory
+from .cache import MetadataCache
+from .items import ITEM_LISTS, itemPage
+from .library_api import AsyncLibrary
+from .orchestrator import RefreshOrchestrator
+from .state import StateManager
+from .tokens import TokenManager
+from .transport import LibraryTransport
 
 from .const import (
+    CACHE_SAVE_DELAY,
+    CACHE_STORAGE_KEY,
+    CACHE_STORAGE_VERSION,
     CONF_AGENCY,
     CONF_HOST,
     CONF_MUNICIPALITY,
     CONF_PINCODE,
     CONF_USER_ID,
+    DATA_BRANCHES,
+    DATA_CACHE,
+    DATA_ORCHESTRATOR,
+    DATA_PENDING,
+    DATA_TRANSPORT,
     DOMAIN,
+    EVENT_CHANGE,
+    ITEMS_PAGE_MAX,
+    ITEMS_PAGE_SIZE,
+    SERVICE_GET_ITEMS,
+    STATE_STORAGE_VERSION,
+    TOKEN_STORAGE_VERSION,
 )
 
 PLATFORMS = [Platform.SENSOR]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+GET_ITEMS_SCHEMA = vol.Schema(
+    {
+        vol.Required("config_entry_id"): cv.string,
+        vol.Required("list"): vol.In(list(ITEM_LISTS)),
+        vol.Optional("offset", default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional("limit", default=ITEMS_PAGE_SIZE): vol.All(vol.Coerce(int), vol.Range(min=1, max=ITEMS_PAGE_MAX)),
+    }
+)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Register the services of the integration."""
+
+    async def get_items(call: ServiceCall) -> ServiceResponse:
+        # The whole lists, a page at a time, as the sensors only show the first materials
+        myLibrary = async_get_libraries(hass).get(call.data["config_entry_id"])
+        if myLibrary is None:
+            raise ServiceValidationError(f"{call.data['config_entry_id']} is not a loaded Bibliotek entry")
+        return itemPage(myLibrary, call.data["list"], call.data["offset"], call.data["limit"])
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_ITEMS, get_items, schema=GET_ITEMS_SCHEMA, supports_response=SupportsResponse.ONLY
+    )
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     """Set up Bibliotek from a config entry."""
     hass.data.setdefault(DOMAIN, {})
 
-    hass.data[DOMAIN][entry.entry_id] = Library(
-        entry.data[CONF_USER_ID],
-        entry.data[CONF_PINCODE],
-        entry.data[CONF_HOST],
-        entry.data[CONF_AGENCY],
-        libraryName=entry.data[CONF_MUNICIPALITY],
-    )
+    # Use the logged in client from the config flow, when the entry was just created
+    myLibrary = hass.data[DOMAIN].get(DATA_PENDING, {}).pop(entry.unique_id, None)
+    if myLibrary is None:
+        myLibrary = await async_create_library(hass, entry.data)
+    hass.data[DOMAIN][entry.entry_id] = myLibrary
+
+    @callback
+    def fire_changes(changes):
+        # One event per changed material, for automations to trigger on
+        for change in changes:
+            hass.bus.async_fire(EVENT_CHANGE, {"entry_id": entry.entry_id, "user": myLibrary.user.name, **change})
+
+    myLibrary.onChanges = fire_changes
+
+    # Reuse the tokens from the last run and renew them in the background
+    tokens = TokenManager(hass, entry, myLibrary)
+    await tokens.async_load()
+    entry.async_on_unload(tokens.async_stop)
+
+    # Show the lists of the last run until the first refresh
+    state = StateManager(hass, entry, myLibrary)
+    await state.async_load()
+    entry.async_on_unload(state.async_stop)
+
     # update options listener
     entry.async_on_unload(entry.add_update_listener(update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
@@ -38,6 +110,80 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def async_create_library(hass: HomeAssistant, data) -> AsyncLibrary:
+    """Create the client of an account, sharing pool, cache and branches with the other accounts."""
+    hass.data.setdefault(DOMAIN, {})
+    cache = await async_get_cache(hass)
+    # Each account gets its own cookies, but shares the connection pool of the integration
+    return AsyncLibrary(
+        async_get_transport(hass),
+        data[CONF_USER_ID],
+        data[CONF_PINCODE],
+        data[CONF_HOST],
+        data[CONF_AGENCY],
+        libraryName=data.get(CONF_MUNICIPALITY),
+        cache=cache,
+        branches=async_get_branches(hass, data[CONF_AGENCY], cache),
+    )
+
+
+async def async_get_cache(hass: HomeAssistant) -> MetadataCache:
+    """Return the metadata cache shared by all accounts, loading it on first use."""
+    if DATA_CACHE not in hass.data[DOMAIN]:
+        store = Store(hass, CACHE_STORAGE_VERSION, CACHE_STORAGE_KEY)
+
+        def schedule_save():
+            store.async_delay_save(cache.as_dict, CACHE_SAVE_DELAY)
+
+        # Stored before loading, so accounts set up at the same time share it
+        cache = hass.data[DOMAIN][DATA_CACHE] = MetadataCache(onChange=schedule_save)
+        cache.load(await store.async_load())
+    return hass.data[DOMAIN][DATA_CACHE]
+
+
+def async_get_transport(hass: HomeAssistant) -> LibraryTransport:
+    """Return the connection pool shared by all accounts, closed when Home Assistant stops."""
+    hass.data.setdefault(DOMAIN, {})
+    if DATA_TRANSPORT not in hass.data[DOMAIN]:
+        transport = hass.data[DOMAIN][DATA_TRANSPORT] = LibraryTransport(get_default_context())
+
+        async def close_transport(event: Event) -> None:
+            await transport.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close_transport)
+    return hass.data[DOMAIN][DATA_TRANSPORT]
+
+
+def async_get_libraries(hass: HomeAssistant) -> dict[str, AsyncLibrary]:
+    """Return the clients of the loaded accounts by the id of their entry."""
+    return {
+        entryId: myLibrary
+        for entryId, myLibrary in hass.data.get(DOMAIN, {}).items()
+        if isinstance(myLibrary, AsyncLibrary)
+    }
+
+
+def async_get_orchestrator(hass: HomeAssistant) -> RefreshOrchestrator:
+    """Return the orchestrator scheduling the refreshes of all accounts."""
+    if DATA_ORCHESTRATOR not in hass.data[DOMAIN]:
+        hass.data[DOMAIN][DATA_ORCHESTRATOR] = RefreshOrchestrator(hass)
+    return hass.data[DOMAIN][DATA_ORCHESTRATOR]
+
+
+def async_get_branches(hass: HomeAssistant, agency: str, cache: MetadataCache) -> BranchDirectory:
+    """Return the branch directory of the agency, shared by the accounts of the agency."""
+    directories = hass.data[DOMAIN].setdefault(DATA_BRANCHES, {})
+    if agency not in directories:
+        directories[agency] = BranchDirectory(agency, cache)
+    return directories[agency]
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the stored tokens and lists of a removed account."""
+    await Store(hass, TOKEN_STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.tokens").async_remove()
+    await Store(hass, STATE_STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.state").async_remove()
+
+
 async def update_listener(hass, entry):
     """Handle options update."""
     await hass.config_entries.async_reload(entry.entry_id)
@@ -46,6 +192,7 @@ async def update_listener(hass, entry):
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        myLibrary = hass.data[DOMAIN].pop(entry.entry_id)
+        await myLibrary.close()
 
     return unload_ok
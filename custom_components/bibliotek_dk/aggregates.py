@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from datetime import date
+
+from .const import DUE_WITHIN_DAYS
+
+# The counts of a summary, added up over the accounts, and its dates, of which the earliest is kept
+SUMMARY_COUNTS = ("loan_count", "overdue_count", "reservation_count", "ready_count", "debts_amount") + tuple(
+    f"due_within_{days}" for days in DUE_WITHIN_DAYS
+)
+SUMMARY_DATES = ("next_due", "next_pickup")
+
+
+def summarize(user, today: date) -> dict:
+    """The counts and nearest deadlines of the lists of a user, as of today."""
+    dues = [loan.expireDate.date() for loan in user.loans if loan.expireDate is not None]
+    pickups = [reservation.pickupDate.date() for reservation in user.reservationsReady if reservation.pickupDate is not None]
+    # A loan passing its due date is only moved to loansOverdue by the next refresh of the loans
+    passed = sum(1 for due in dues if due < today)
+    summary = {
+        "loan_count": len(user.loans) - passed,
+        "overdue_count": len(user.loansOverdue) + passed,
+        "next_due": min((due for due in dues if due >= today), default=None),
+        "reservation_count": len(user.reservations),
+        "ready_count": len(user.reservationsReady),
+        "next_pickup": min((pickup for pickup in pickups if pickup >= today), default=None),
+        "debts_amount": user.debtsAmount,
+    }
+    for days in DUE_WITHIN_DAYS:
+        summary[f"due_within_{days}"] = sum(1 for due in dues if 0 <= (due - today).days <= days)
+    return summary
+
+
+def combine(summaries: list[dict]) -> dict:
+    """The summary of a household, from the summaries of its accounts."""
+    combined = {"accounts": len(summaries)}
+    for key in SUMMARY_COUNTS:
+        combined[key] = sum(summary[key] for summary in summaries)
+    for key in SUMMARY_DATES:
+        combined[key] = min((summary[key] for summary in summaries if summary[key] is not None), default=None)
+    return combined
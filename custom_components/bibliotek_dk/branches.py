@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import aiohttp
+import asyncio
+import logging
+
+from .cache import MetadataCache
+from .const import (
+    BRANCH_PAGE_SIZE,
+    CACHE_AGENCIES,
+    URL_BRANCHES,
+    branch_query,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BranchDirectory:
+    """The active branches of an agency, shared by all accounts of that agency.
+
+    The whole list is loaded in one paginated sweep and kept in the metadata
+    cache, which also decides when it is swept again. Looking up a branch is
+    then a dict lookup. An expired list is served until a new sweep succeeds.
+    """
+
+    def __init__(self, agency: str, cache: MetadataCache) -> None:
+        self.agency = str(agency).split('-')[-1]
+        self._cache = cache
+        self._lock = asyncio.Lock()
+        # The last list seen, the cache drops it when it expires
+        self._branches = {}
+
+    def get(self, id, default=None):
+        branches = self._cache.get(CACHE_AGENCIES, self.agency)
+        if branches is not None:
+            self._branches = branches
+        return self._branches.get(str(id).split('-')[-1], default)
+
+    async def async_load(self, request):
+        # request is the _request of the account asking, so the sweep uses its session
+        if self._cache.has(CACHE_AGENCIES, self.agency):
+            return
+        async with self._lock:
+            if self._cache.has(CACHE_AGENCIES, self.agency) or self._cache.isMissing(CACHE_AGENCIES, self.agency):
+                return
+            branches = await self._sweep(request)
+            if branches:
+                self._cache.set(CACHE_AGENCIES, self.agency, branches)
+                self._branches = branches
+            else:
+                self._cache.setMissing(CACHE_AGENCIES, self.agency)
+
+    async def _sweep(self, request):
+        branches, offset = {}, 0
+        header = {'Accept': '*/*'}
+        while True:
+            params = {
+                'query': branch_query,
+                'variables': {'language': "DA", 'limit': BRANCH_PAGE_SIZE, 'offset': offset, 'agencyId': self.agency}
+            }
+            try:
+                res = await request("POST", URL_BRANCHES, headers=header, json=params, endpoint="branches")
+                if res.status != 200:
+                    _LOGGER.error("Error loading the branches of agency %s, status %s", self.agency, res.status)
+                    return None
+                data = res.json()['data']['branches']
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as err:
+                _LOGGER.error("Error loading the branches of agency %s. Error: %s", self.agency, err)
+                return None
+            for branch in data['result']:
+                branches[str(branch['branchId']).split('-')[-1]] = branch['name']
+            offset += len(data['result'])
+            if not data['result'] or offset >= data['hitcount']:
+                break
+        _LOGGER.debug("Loaded %d branches of agency %s", len(branches), self.agency)
+        return branches
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from datetime import timedelta
+import json
+import logging
+import time
+
+from .const import (
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_RETRY_MAX,
+    CACHE_RETRY_MIN,
+    CACHE_TTL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """Metadata on materials, eReolen products and branches, shared by all accounts.
+
+    Entries are kept per kind with a timestamp, so they can be persisted and
+    expire after the TTL of their kind. Each kind is a LRU bounded by number of
+    entries and by the approximate size of the values. Keys that failed to
+    resolve are remembered with an exponential back-off, so they are not looked
+    up on every update.
+    """
+
+    def __init__(
+        self, ttl: dict[str, timedelta] = CACHE_TTL, maxEntries: int = CACHE_MAX_ENTRIES,
+        maxBytes: int = CACHE_MAX_BYTES, onChange=None,
+    ) -> None:
+        self._ttl = {kind: value.total_seconds() for kind, value in ttl.items()}
+        self._maxEntries = maxEntries
+        self._maxBytes = maxBytes
+        self._data = {kind: OrderedDict() for kind in ttl}
+        self._sizes = {kind: {} for kind in ttl}
+        self._bytes = {kind: 0 for kind in ttl}
+        # key -> (failures, retry at), only kept in memory
+        self._missing = {kind: OrderedDict() for kind in ttl}
+        # Called when the content changes, used to schedule a save of the cache
+        self._onChange = onChange
+        # Lookups through get, has and peek do not count
+        self._hits = {kind: 0 for kind in ttl}
+        self._misses = {kind: 0 for kind in ttl}
+
+    def get(self, kind, key, default=None):
+        value = self._lookup(kind, key)
+        if value is None:
+            self._misses[kind] += 1
+            return default
+        self._hits[kind] += 1
+        return value
+
+    def peek(self, kind, key, default=None):
+        # Like get, for a lookup already counted
+        value = self._lookup(kind, key)
+        return default if value is None else value
+
+    def has(self, kind, key):
+        return self._lookup(kind, key) is not None
+
+    def set(self, kind, key, value):
+        self._missing[kind].pop(key, None)
+        self._remove(kind, key)
+        self._add(kind, key, [time.time(), value])
+        self._evict(kind)
+        if self._onChange:
+            self._onChange()
+
+    def isMissing(self, kind, key):
+        # True while a key that failed is waiting for its next retry
+        missing = self._missing[kind].get(key)
+        return missing is not None and missing[1] > time.time()
+
+    def setMissing(self, kind, key):
+        failures = self._missing[kind].pop(key, (0, 0))[0] + 1
+        delay = min(CACHE_RETRY_MIN.total_seconds() * 2 ** (failures - 1), CACHE_RETRY_MAX.total_seconds())
+        self._missing[kind][key] = (failures, time.time() + delay)
+        while len(self._missing[kind]) > self._maxEntries:
+            self._missing[kind].popitem(last=False)
+        _LOGGER.debug("No %s for '%s', retrying in %d seconds", kind, key, delay)
+
+    def stats(self):
+        return {
+            kind: {
+                "entries": len(entries),
+                "bytes": self._bytes[kind],
+                "missing": len(self._missing[kind]),
+                "hits": self._hits[kind],
+                "misses": self._misses[kind],
+            }
+            for kind, entries in self._data.items()
+        }
+
+    def load(self, data):
+        # Restore the entries from storage, dropping unknown kinds and expired entries
+        now = time.time()
+        for kind, entries in (data or {}).items():
+            if kind not in self._data:
+                continue
+            for key, entry in sorted(entries.items(), key=lambda item: item[1][0]):
+                if now - entry[0] <= self._ttl[kind]:
+                    self._remove(kind, key)
+                    self._add(kind, key, entry)
+            self._evict(kind)
+        _LOGGER.debug("Loaded metadata cache: %s", self.stats())
+
+    def as_dict(self):
+        return self._data
+
+    def _lookup(self, kind, key):
+        entry = self._data[kind].get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self._ttl[kind]:
+            self._remove(kind, key)
+            return None
+        self._data[kind].move_to_end(key)
+        return entry[1]
+
+    def _add(self, kind, key, entry):
+        size = len(json.dumps(entry[1]))
+        self._data[kind][key] = entry
+        self._sizes[kind][key] = size
+        self._bytes[kind] += size
+
+    def _remove(self, kind, key):
+        if self._data[kind].pop(key, None) is not None:
+            self._bytes[kind] -= self._sizes[kind].pop(key)
+
+    def _evict(self, kind):
+        # Drop the least recently used entries until the kind is within its limits
+        entries = self._data[kind]
+        while entries and (len(entries) > self._maxEntries or self._bytes[kind] > self._maxBytes):
+            self._remove(kind, next(iter(entries)))
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from collections import defaultdict
+import aiohttp
+import asyncio
+import json
+import logging
+import re
+
+from .transport import ApiResponse, LibraryTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+# CPR numbers, with or without the dash, and the tokens in the answer of /dpl-react/user-tokens
+_CPR = re.compile(r'(?<!\d)\d{6}-?\d{4}(?!\d)')
+_TOKENS = re.compile(r'("(?:user|library)"\s*[,:]\s*")([^"]+)(")')
+
+
+def _placeholder(match):
+    # The same shape, so a number in a JSON body stays a number, without the leading zero JSON does not allow
+    text = re.sub(r'[^\W\d_]', 'x', re.sub(r'\d', '0', match.group()))
+    return re.sub(r'^0', '1', text)
+
+
+class Cassette:
+    """Answers of the library servers, recorded for replaying them offline.
+
+    Everything is scrubbed before it is kept: the CPR number and pincode of
+    the account, anything looking like a CPR number and the tokens. Numbers
+    and words are replaced by placeholders of the same shape, so the bodies
+    still parse. The request bodies are only kept for matching, and the login
+    form not at all.
+    """
+
+    def __init__(
+        self, interactions: list[dict] | None = None, secrets: list[str] | None = None, meta: dict | None = None,
+    ) -> None:
+        self.interactions = interactions or []
+        # Anything needed to replay, like the host and agency of the library
+        self.meta = meta or {}
+        # Only whole words, a pincode is short enough to be part of an id
+        self._secrets = [
+            re.compile(rf'(?<!\w){re.escape(secret)}(?!\w)')
+            for secret in sorted((secret for secret in secrets or [] if secret), key=len, reverse=True)
+        ]
+
+    def scrub(self, text):
+        if not text:
+            return text
+        for secret in self._secrets:
+            text = secret.sub(_placeholder, text)
+        text = _TOKENS.sub(r'\1<token>\3', text)
+        return _CPR.sub(_placeholder, text)
+
+    def key(self, method, url, **kwargs):
+        # The login form is not part of the key, it holds the CPR number and pincode
+        return self.scrub(json.dumps(
+            [method, url, kwargs.get('params'), kwargs.get('json')], sort_keys=True, default=str
+        ))
+
+    def append(self, method, url, response: ApiResponse, **kwargs):
+        self.interactions.append({
+            'key': self.key(method, url, **kwargs),
+            'status': response.status,
+            'url': self.scrub(response.url),
+            'body': self.scrub(response.text),
+        })
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'version': CASSETTE_VERSION, 'meta': self.meta, 'interactions': self.interactions},
+                file, indent=1, ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unknown cassette version {data.get('version')}")
+        return cls(data['interactions'], meta=data.get('meta'))
+
+
+class RecordingTransport(LibraryTransport):
+    """Sends the requests like LibraryTransport, and keeps the scrubbed answers in a cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    async def _send(self, session: aiohttp.ClientSession, method, url, **kwargs) -> ApiResponse:
+        response = await super()._send(session, method, url, **kwargs)
+        self.cassette.append(method, url, response, **kwargs)
+        return response
+
+
+class ReplayTransport(LibraryTransport):
+    """Answers the requests from a cassette, without a network.
+
+    Requests are matched on method, URL, query and JSON body. Answers to the
+    same request are replayed in the order they were recorded, the last one
+    again when they run out, and a request missing from the cassette gets a
+    404. latency is added to every answer, in seconds.
+    """
+
+    def __init__(self, cassette: Cassette, latency: float = 0, **kwargs) -> None:
+        # Replays are not rate limited, unless asked to
+        kwargs.setdefault('ratePerHost', 1e9)
+        kwargs.setdefault('rateBurst', 10**9)
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.latency = latency
+        self.unmatched = []
+        self._answers = defaultdict(list)
+        for interaction in cassette.interactions:
+            self._answers[interaction['key']].append(interaction)
+
+    async def _send(self, session: aiohttp.ClientSession, method, url, **kwargs) -> ApiResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        key = self.cassette.key(method, url, **kwargs)
+        answers = self._answers.get(key)
+        if not answers:
+            _LOGGER.warning("No recorded answer to %s %s", method, url)
+            self.unmatched.append(key)
+            return ApiResponse(404, url, '')
+        interaction = answers.pop(0) if len(answers) > 1 else answers[0]
+        return ApiResponse(interaction['status'], interaction['url'], interaction['body'])
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from .items import ITEM_LISTS, iso
+
+CHANGE_ADDED = "added"
+CHANGE_BECAME_READY = "became_ready"
+CHANGE_DUE_CHANGED = "due_changed"
+CHANGE_QUEUE_CHANGED = "queue_changed"
+CHANGE_REMOVED = "removed"
+
+# The names in the attributes and the service, by the list of libraryUser
+_NAMES = {attribute: (name, item) for name, (attribute, item) in ITEM_LISTS.items()}
+
+
+def itemKey(obj):
+    # Physical loans by their loan, eReolen loans by their order, physical reservations by their
+    # transaction and eReolen reservations by their product, which stay the same across refreshes
+    for attribute in ('renewId', 'orderId', 'transactionId'):
+        value = getattr(obj, attribute, None)
+        if value is not None:
+            return f"{attribute}:{value}"
+    return f"id:{obj.id}"
+
+
+def _change(kind, attribute, obj, **extra):
+    name, item = _NAMES[attribute]
+    return {"type": kind, "list": name, "key": itemKey(obj), "item": item(obj), **extra}
+
+
+def diffLists(before: dict, after: dict) -> list[dict]:
+    """What changed between two versions of the lists of a category, item by item.
+
+    before and after map a list of libraryUser, like loans and loansOverdue,
+    to its materials. A material moving between the lists of the category is
+    matched by its key, so a reservation becoming ready is not seen as one
+    removed and one added.
+    """
+    old = {itemKey(obj): (attribute, obj) for attribute, objs in before.items() for obj in objs}
+    new = {itemKey(obj): (attribute, obj) for attribute, objs in after.items() for obj in objs}
+    changes = []
+    for key, (attribute, obj) in new.items():
+        if key not in old:
+            changes.append(_change(CHANGE_ADDED, attribute, obj))
+            continue
+        oldAttribute, oldObj = old[key]
+        if attribute == 'reservationsReady' and oldAttribute == 'reservations':
+            changes.append(_change(CHANGE_BECAME_READY, attribute, obj))
+        if attribute in ('loans', 'loansOverdue') and obj.expireDate != oldObj.expireDate:
+            # Renewed, or moved by the library
+            changes.append(_change(CHANGE_DUE_CHANGED, attribute, obj, old=iso(oldObj.expireDate), new=iso(obj.expireDate)))
+        if attribute == 'reservations' == oldAttribute and obj.queueNumber != oldObj.queueNumber:
+            changes.append(_change(CHANGE_QUEUE_CHANGED, attribute, obj, old=oldObj.queueNumber, new=obj.queueNumber))
+    for key in old.keys() - new.keys():
+        attribute, obj = old[key]
+        changes.append(_change(CHANGE_REMOVED, attribute, obj))
+    return changes
@@ -2,12 +2,13 @@
 from __future__ import annotations
 
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.data_entry_flow import FlowResult
+from homeassistant.data_entry_flow import AbortFlow, FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import selector
 from homeassistant import config_entries
 
-from .library_api import Library
+from . import async_create_library
+from .library_api import AsyncLibrary
 from bs4 import BeautifulSoup as BS
 from typing import Any
 
@@ -18,9 +19,12 @@ import requests
 import voluptuous as vol
 
 from .const import (
+    ATTRIBUTE_LIMIT,
     CONF_AGENCY,
+    CONF_ATTRIBUTE_LIMIT,
     CONF_BRANCH_ID,
     CONF_HOST,
+    CONF_MAX_UPDATE_INTERVAL,
     CONF_MUNICIPALITY,
     CONF_NAME,
     CONF_PINCODE,
@@ -30,8 +34,10 @@ from .const import (
     CONF_SHOW_RESERVATIONS,
     CONF_UPDATE_INTERVAL,
     CONF_USER_ID,
+    DATA_PENDING,
     DOMAIN,
     HEADERS,
+    MAX_UPDATE_INTERVAL,
     MUNICIPALITY_LOOKUP_URL,
     UPDATE_INTERVAL,
     URL_FALLBACK,
@@ -51,6 +57,9 @@ async def validate_input(
     data[CONF_UPDATE_INTERVAL] = (
         data[CONF_UPDATE_INTERVAL] if data[CONF_UPDATE_INTERVAL] else UPDATE_INTERVAL
     )
+    data[CONF_MAX_UPDATE_INTERVAL] = max(
+        data.get(CONF_MAX_UPDATE_INTERVAL) or MAX_UPDATE_INTERVAL, data[CONF_UPDATE_INTERVAL]
+    )
 
     # Typecast userId and Pincode to string:
     data[CONF_USER_ID] = re.sub(r"\D", "", data[CONF_USER_ID])
@@ -63,14 +72,19 @@ async def validate_input(
             libraryObj.user.userId == data[CONF_USER_ID]
             and libraryObj.host == data[CONF_HOST]
             for libraryObj in hass.data[DOMAIN].values()
+            if isinstance(libraryObj, AsyncLibrary)
         ):
             raise UserExist
 
-    myLibrary = Library(data[CONF_USER_ID], data[CONF_PINCODE], data[CONF_HOST], data[CONF_AGENCY])
-    # Try to login to test the credentails
-    if not await hass.async_add_executor_job(myLibrary.login):
-        raise InvalidAuth
-    del myLibrary
+    myLibrary = await async_create_library(hass, data)
+    # Try to login to test the credentails, the logged in client is handed to the new entry
+    try:
+        if not await myLibrary.login():
+            raise InvalidAuth
+        await myLibrary.urls()
+    except Exception:
+        await myLibrary.close()
+        raise
 
     # Return info that you want to store in the config entry.
     title = (
@@ -78,7 +92,7 @@ async def validate_input(
         if data[CONF_NAME]
         else data[CONF_MUNICIPALITY]
     )
-    return {"title": title, "data": data}
+    return {"title": title, "data": data, "library": myLibrary}
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -211,7 +225,13 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             else:
                 await self.async_set_unique_id(user_input[CONF_USER_ID])
                 # Abort the flow if a config entry with the same unique ID exists
-                self._abort_if_unique_id_configured()
+                try:
+                    self._abort_if_unique_id_configured()
+                except AbortFlow:
+                    await info["library"].close()
+                    raise
+                # async_setup_entry picks up the client, so the account is only logged in once
+                self.hass.data[DOMAIN].setdefault(DATA_PENDING, {})[self.unique_id] = info["library"]
                 return self.async_create_entry(title=info["title"], data=info["data"])
 
         return self.async_show_form(
@@ -236,6 +256,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     vol.Optional(CONF_SHOW_RESERVATIONS, default=True): bool,
                     #                    vol.Required(CONF_SHOW_RESERVATIONS_READY, default=True): bool,
                     vol.Optional(CONF_UPDATE_INTERVAL, default=UPDATE_INTERVAL): int,
+                    vol.Optional(CONF_MAX_UPDATE_INTERVAL, default=MAX_UPDATE_INTERVAL): int,
+                    vol.Optional(CONF_ATTRIBUTE_LIMIT, default=ATTRIBUTE_LIMIT): vol.All(int, vol.Range(min=0)),
                 }
             ),
             errors=errors,
@@ -260,6 +282,8 @@ class OptionsFlow(config_entries.OptionsFlow):
                     vol.Optional(CONF_SHOW_DEBTS, default=data[CONF_SHOW_DEBTS]): bool,
                     vol.Optional(CONF_SHOW_RESERVATIONS, default=data[CONF_SHOW_RESERVATIONS]): bool,
                     vol.Optional(CONF_UPDATE_INTERVAL, default=data[CONF_UPDATE_INTERVAL]): int,
+                    vol.Optional(CONF_MAX_UPDATE_INTERVAL, default=data.get(CONF_MAX_UPDATE_INTERVAL, MAX_UPDATE_INTERVAL)): int,
+                    vol.Optional(CONF_ATTRIBUTE_LIMIT, default=data.get(CONF_ATTRIBUTE_LIMIT, ATTRIBUTE_LIMIT)): vol.All(int, vol.Range(min=0)),
                 })
 
         return self.async_show_form(
@@ -1,6 +1,39 @@
+from datetime import timedelta
+
+# Materials of a list shown in the attributes of its sensor, the full list is served by SERVICE_GET_ITEMS
+ATTRIBUTE_LIMIT = 10
+
+# Number of branches per page, when loading the branches of an agency
+BRANCH_PAGE_SIZE = 50
+
+CACHE_AGENCIES = "agencies"
+CACHE_DETAILS = "details"
+CACHE_PRODUCTS = "products"
+CACHE_TTL = {
+    CACHE_AGENCIES: timedelta(days=1),
+    CACHE_DETAILS: timedelta(days=30),
+    CACHE_PRODUCTS: timedelta(days=30),
+}
+CACHE_MAX_BYTES = 4 * 1024 * 1024
+CACHE_MAX_ENTRIES = 5000
+CACHE_RETRY_MAX = timedelta(days=1)
+CACHE_RETRY_MIN = timedelta(hours=1)
+CACHE_SAVE_DELAY = 60
+CACHE_STORAGE_KEY = "bibliotek_dk.metadata"
+CACHE_STORAGE_VERSION = 1
+
+# The categories of data, each refreshed at its own pace
+CATEGORY_DEBTS = "debts"
+CATEGORY_EREOLEN = "ereolen"
+CATEGORY_LOANS = "loans"
+CATEGORY_PROFILE = "profile"
+CATEGORY_RESERVATIONS = "reservations"
+
 CONF_AGENCY = "agency"
+CONF_ATTRIBUTE_LIMIT = "attribute_limit"
 CONF_BRANCH_ID = "branchId"
 CONF_HOST = "host"
+CONF_MAX_UPDATE_INTERVAL = "max_update_interval"
 CONF_MUNICIPALITY = "municipality"
 CONF_NAME = "name"
 CONF_PINCODE = "pincode"
@@ -12,8 +45,30 @@ CONF_UPDATE_INTERVAL = "update_interval"
 CONF_USER_ID = "user_id"
 CREDITS = "J-Lindvig & TermeHansen (https://github.com/TermeHansen/Bibliotek_dk)"
 
+DATA_BRANCHES = "branch_directories"
+DATA_CACHE = "metadata_cache"
+DATA_HOUSEHOLD = "household"
+DATA_ORCHESTRATOR = "orchestrator"
+DATA_PENDING = "pending_libraries"
+DATA_TRANSPORT = "transport"
+
+# Number of materials resolved in one GraphQL call to the FBI API
+DETAILS_BATCH_SIZE = 25
+
+# The categories whose materials are compared between refreshes
+DIFF_CATEGORIES = (CATEGORY_LOANS, CATEGORY_RESERVATIONS, CATEGORY_EREOLEN)
+
 DOMAIN = "bibliotek_dk"
 
+# Loans due within this many days, today included, are counted by the summary of the lists
+DUE_WITHIN_DAYS = (1, 3, 7)
+
+# Number of eReolen product lookups running at the same time
+EREOLEN_WORKERS = 4
+
+# Fired for every material added, removed, renewed, moved in the queue or ready for pickup
+EVENT_CHANGE = "bibliotek_dk_change"
+
 HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
     "Accept-Encoding": "gzip, deflate, br",
@@ -23,27 +78,79 @@ HEADERS = {
     "Referer": "https://www.google.dk/",
 }
 
+# Materials per page of SERVICE_GET_ITEMS, by default and at most
+ITEMS_PAGE_SIZE = 50
+ITEMS_PAGE_MAX = 500
+
 JSON_HEADERS = {
     "Accept-Encoding": "gzip, deflate, br, zstd",
     "Content-Type": "application/json",
     'Accept': '*/*',
 }
 
+# Longest interval between updates in minutes, when nothing is due soon
+MAX_UPDATE_INTERVAL = 1440
+
+# Upper bounds in seconds of the latency histogram of each endpoint
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
 MUNICIPALITY_LOOKUP_URL = "https://api.dataforsyningen.dk/kommuner/reverse?x=LON&y=LAT"
 
+# How often the orchestrator looks for due refreshes, the refreshes running at the same time
+# and the random spread of the intervals
+ORCHESTRATOR_JITTER = 0.1
+ORCHESTRATOR_TICK = timedelta(seconds=30)
+ORCHESTRATOR_WORKERS = 4
+
+# Interval between updates of the profile of the user, it rarely changes
+PROFILE_UPDATE_INTERVAL = timedelta(days=1)
+
+# The nearest deadline is updated this many times before it passes
+POLLS_PER_DEADLINE = 4
+# Longest interval between updates, while a reservation is first in the queue
+QUEUE_FRONT_INTERVAL = timedelta(hours=1)
+
+SERVICE_GET_ITEMS = "get_items"
+# Sent when a coordinator of any account refreshed, for the sensors covering all accounts
+SIGNAL_UPDATED = "bibliotek_dk_updated"
+
+# Seconds a change of the lists is held before storing them, to restore them at startup
+STATE_SAVE_DELAY = 10
+STATE_STORAGE_VERSION = 1
+
+# Assumed lifetime of the user token, and how long before expiry it is renewed in the background
+TOKEN_LIFETIME = timedelta(days=7)
+TOKEN_REFRESH_MARGIN = timedelta(days=1)
+TOKEN_RETRY = timedelta(hours=1)
+TOKEN_STORAGE_VERSION = 1
+
+# Retries of a request answered with 5xx or 429, or failing to connect, and the back-off between them in seconds
+TRANSPORT_BACKOFF = 1
+TRANSPORT_BACKOFF_MAX = 30
+TRANSPORT_RETRIES = 2
+# Failed requests in a row before failing fast on a host, and seconds before trying the host again
+TRANSPORT_BREAKER_FAILURES = 5
+TRANSPORT_BREAKER_RESET = 300
+# Seconds before giving up on connecting, on waiting for data and on the whole request
+TRANSPORT_CONNECT_TIMEOUT = 10
+TRANSPORT_READ_TIMEOUT = 30
+TRANSPORT_TOTAL_TIMEOUT = 60
+# Connections of the shared pool, in total, per host and idle time before closing
+TRANSPORT_KEEPALIVE = 60
+TRANSPORT_LIMIT = 100
+TRANSPORT_LIMIT_PER_HOST = 10
+# Requests per second to each upstream host across all accounts, and the burst allowed
+TRANSPORT_RATE_BURST = 10
+TRANSPORT_RATE_PER_HOST = 5
+
 UPDATE_INTERVAL = 60
+URL_BRANCHES = "https://bibliotek.dk/api/bibdk21/graphql"
 URL_FALLBACK = "https://bibliotek.kk.dk"
 URL_LOGIN = "/login"
 URL_LOGIN_PAGE = "/login?current-path=/user/me/dashboard"
 
 
-details_query = '''
-    query getManifestationViaMaterialByFaust($faust: String!) {
-  manifestation(faust: $faust) {
-    ...ManifestationBasicDetails
-  }
-}
-
+details_fragment = '''
     fragment ManifestationBasicDetails on Manifestation {
   pid
   titles {
@@ -63,6 +170,14 @@ details_query = '''
 }
 '''
 
+details_query = '''
+    query getManifestationViaMaterialByFaust($faust: String!) {
+  manifestation(faust: $faust) {
+    ...ManifestationBasicDetails
+  }
+}
+''' + details_fragment
+
 branch_query = '''
 query LibraryFragmentsSearch(
     $q: String,
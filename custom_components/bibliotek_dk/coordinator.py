@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from datetime import timedelta
+import aiohttp
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import DOMAIN
+from .library_api import AsyncLibrary
+from .scheduler import nextUpdateInterval, urgency
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LibraryCoordinator(DataUpdateCoordinator):
+    """Refreshes one category of an account, at the pace of that category."""
+
+    def __init__(
+        self, hass: HomeAssistant, myLibrary: AsyncLibrary, category: str, minInterval: timedelta, maxInterval: timedelta
+    ) -> None:
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {category} ({myLibrary.user.date})",
+            # The refreshes are scheduled by the RefreshOrchestrator of the integration
+            update_interval=None,
+        )
+        self.myLibrary = myLibrary
+        self.category = category
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.nextInterval = minInterval
+
+    async def _async_update_data(self):
+        # Call, and wait for it to finish, the function with the refresh procedure
+        try:
+            await self.myLibrary.refresh(self.category)
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError, ValueError) as err:
+            # The lists of the category are left as they were, and served as stale
+            raise UpdateFailed(f"Error refreshing {self.category}: {err}") from err
+        # Poll often when something is due soon, and back off when nothing is
+        self.nextInterval = nextUpdateInterval(self.myLibrary, self.category, self.minInterval, self.maxInterval)
+        _LOGGER.debug("%s: next update in %s", self.name, self.nextInterval)
+
+    @property
+    def hasData(self):
+        # Refreshed at least once, so there is a snapshot to show even when the latest refresh failed
+        return self.myLibrary.dataAge(self.category) is not None
+
+    @property
+    def urgency(self):
+        return urgency(self.myLibrary, self.category)
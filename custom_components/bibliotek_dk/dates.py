@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from dateutil import parser
+
+
+@lru_cache(maxsize=1024)
+def parseDate(value, utc: bool = False) -> datetime | None:
+    """A timestamp of the APIs as a naive datetime in local time, like datetime.now().
+
+    The timestamps are ISO 8601, so fromisoformat reads them and dateutil is
+    only asked when it can not. A timestamp with an offset is converted to
+    local time, and a naive one is taken as local time, or as UTC when utc is
+    set, like the ...Utc fields of pubhub. Many materials share their dates,
+    so the results are cached.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        parsed = parser.parse(value)
+    if parsed.tzinfo is None:
+        if not utc:
+            return parsed
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone().replace(tzinfo=None)
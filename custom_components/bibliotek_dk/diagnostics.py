@@ -0,0 +1,40 @@
+"""Diagnostics support for Bibliotek."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    CATEGORY_DEBTS,
+    CATEGORY_EREOLEN,
+    CATEGORY_LOANS,
+    CATEGORY_PROFILE,
+    CATEGORY_RESERVATIONS,
+    CONF_PINCODE,
+    CONF_USER_ID,
+    DOMAIN,
+)
+
+TO_REDACT = {CONF_PINCODE, CONF_USER_ID}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return the metrics of the account and the shared metadata cache."""
+    myLibrary = hass.data[DOMAIN][entry.entry_id]
+    categories = (CATEGORY_PROFILE, CATEGORY_LOANS, CATEGORY_RESERVATIONS, CATEGORY_DEBTS, CATEGORY_EREOLEN)
+    return {
+        "entry": async_redact_data({**entry.data, **entry.options}, TO_REDACT),
+        "categories": {
+            category: {
+                "data_age": None if (age := myLibrary.dataAge(category)) is None else age.total_seconds(),
+                "stale": myLibrary.isStale(category),
+            }
+            for category in categories
+        },
+        "endpoints": myLibrary.metrics.summary(),
+        "metrics": myLibrary.metrics.as_dict(),
+        "cache": myLibrary.cache.stats(),
+    }
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+
+def iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def loanItem(loan):
+    return {
+        "title": loan.title,
+        "creators": loan.creators,
+        "type": loan.type,
+        "loan_date": iso(loan.loanDate),
+        "expire_date": iso(loan.expireDate),
+        "renewable": loan.renewAble,
+        "order_id": loan.orderId,
+        "url": loan.url,
+        "cover": loan.coverUrl,
+    }
+
+
+def reservationItem(reservation):
+    return {
+        "title": reservation.title,
+        "creators": reservation.creators,
+        "type": reservation.type,
+        "queue_number": reservation.queueNumber,
+        "created_date": iso(reservation.createdDate),
+        "expire_date": iso(reservation.expireDate),
+        "pickup_library": reservation.pickupLibrary,
+        "url": reservation.url,
+        "cover": reservation.coverUrl,
+    }
+
+
+def reservationReadyItem(reservationReady):
+    return {
+        "title": reservationReady.title,
+        "creators": reservationReady.creators,
+        "type": reservationReady.type,
+        "reservation_number": reservationReady.reservationNumber,
+        "created_date": iso(reservationReady.createdDate),
+        "pickup_date": iso(reservationReady.pickupDate),
+        "pickup_library": reservationReady.pickupLibrary,
+        "url": reservationReady.url,
+        "cover": reservationReady.coverUrl,
+    }
+
+
+def debtItem(debt):
+    return {
+        "title": debt.title,
+        "type": debt.type,
+        "fee_date": iso(debt.feeDate),
+        "fee_type": debt.feeType,
+        "fee_amount": debt.feeAmount,
+        "url": debt.url,
+        "cover": debt.coverUrl,
+    }
+
+
+# The lists by the name used in the attributes and the service, with the list of libraryUser and how an item looks
+ITEM_LISTS = {
+    "loans": ("loans", loanItem),
+    "loans_overdue": ("loansOverdue", loanItem),
+    "reservations": ("reservations", reservationItem),
+    "reservations_ready": ("reservationsReady", reservationReadyItem),
+    "debts": ("debts", debtItem),
+}
+
+
+def itemPage(myLibrary, name, offset=0, limit=None):
+    """A page of a list of the user, in the order of the list, by due date for the loans."""
+    attribute, item = ITEM_LISTS[name]
+    # mergeLists replaces a changed list instead of changing it, so the page is consistent
+    items = getattr(myLibrary.user, attribute)
+    end = len(items) if limit is None else offset + limit
+    return {
+        "list": name,
+        "total": len(items),
+        "offset": offset,
+        # Changes when the list changes, to tell pages of different versions apart
+        "generation": myLibrary.generations[attribute],
+        "items": [item(obj) for obj in items[offset:end]],
+    }
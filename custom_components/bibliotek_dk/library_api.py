@@ -1,17 +1,32 @@
 from __future__ import annotations
 
 from bs4 import BeautifulSoup as BS
-from dateutil import parser
-from datetime import timedelta, datetime
+from dataclasses import InitVar, asdict, dataclass, field, fields
+from datetime import date, timedelta, datetime
+from functools import lru_cache
+import asyncio
 import logging
 import re
-import requests
+import sys
 
+from .aggregates import summarize
+from .branches import BranchDirectory
+from .cache import MetadataCache
+from .changes import diffLists
 from .const import (
-    HEADERS, JSON_HEADERS,
+    CACHE_DETAILS, CACHE_PRODUCTS,
+    CATEGORY_DEBTS, CATEGORY_EREOLEN, CATEGORY_LOANS, CATEGORY_PROFILE, CATEGORY_RESERVATIONS,
+    DETAILS_BATCH_SIZE,
+    DIFF_CATEGORIES,
+    EREOLEN_WORKERS,
+    JSON_HEADERS,
+    TOKEN_LIFETIME,
     URL_LOGIN_PAGE,
-    details_query, branch_query,
+    details_fragment, details_query,
 )
+from .dates import parseDate
+from .metrics import Metrics
+from .transport import ApiResponse, LibraryTransport
 DEBUG = True
 
 
@@ -19,26 +34,67 @@ _LOGGER: logging.Logger = logging.getLogger(__package__)
 _LOGGER = logging.getLogger(__name__)
 
 
-class Library:
+@lru_cache(maxsize=8)
+def _detailsBatchQuery(count):
+    # One aliased manifestation field per material, m0, m1, ... in the order of the variables
+    variables = ', '.join(f'$faust{n}: String!' for n in range(count))
+    fields = '\n'.join(f'  m{n}: manifestation(faust: $faust{n}) {{\n    ...ManifestationBasicDetails\n  }}' for n in range(count))
+    return f'\n    query getManifestationsViaMaterialByFaust({variables}) {{\n{fields}\n}}\n' + details_fragment
+
+
+class AsyncLibrary:
     host, libraryName, icon, user = None, None, None, None
     loggedIn = False
     use_eReolen, get_loans, get_reservations, get_depts = True, True, True, True
+    details_batch_size = DETAILS_BATCH_SIZE
+    # Called when new tokens are set, so they can be persisted
+    onTokens = None
+    # Called when the lists or the profile changed, so they can be persisted
+    onState = None
 
     def __init__(
-        self, userId: str, pincode: str, host: str, agency: str, libraryName=None
+        self, transport: LibraryTransport, userId: str, pincode: str, host: str, agency: str, libraryName=None,
+        cache: MetadataCache | None = None, branches: BranchDirectory | None = None,
     ) -> None:
 
-        self.session = requests.Session()
-        self.session.headers = HEADERS
+        # The session holds the cookies of this user only, the connections are pooled by the transport
+        self.transport = transport
+        self.session = transport.session()
 
         self._json_header = JSON_HEADERS.copy()
         self._json_header["Origin"] = host
         self._json_header["Referer"] = host
         self._user_token = ''
-        self.branches = {}
+        self._library_token = ''
+        self._user_token_exp = datetime.now()
         self._urls = {}
-        self._details = {}
+        # Details, products and branch names, shared with the other accounts when given
+        self.cache = cache if cache is not None else MetadataCache()
+        # The branches of the agency, shared with the other accounts of the agency when given
+        self.branches = branches if branches is not None else BranchDirectory(agency, self.cache)
+        self._productWorkers = asyncio.Semaphore(EREOLEN_WORKERS)
+        # Calls of this account per endpoint, the cache keeps its own hits and misses
+        self.metrics = Metrics()
+        self._loginLock = asyncio.Lock()
+        self._urlsLock = asyncio.Lock()
         self.loggedIn = ''
+        # The materials per category, merged into the lists of the user
+        self.lists = {
+            CATEGORY_LOANS: {'loans': [], 'loansOverdue': []},
+            CATEGORY_RESERVATIONS: {'reservations': [], 'reservationsReady': []},
+            CATEGORY_EREOLEN: {'loans': [], 'reservations': []},
+            CATEGORY_DEBTS: {'debts': []},
+        }
+        # Bumped when a list of the user, or the profile, changes, so what is built from it can be reused until then
+        self.generations = dict.fromkeys(('loans', 'loansOverdue', 'reservations', 'reservationsReady', 'debts', 'profile'), 0)
+        self._profile = None
+        self._summary = None
+        self._summaryKey = None
+        # When each category was last refreshed, and whether the latest try failed
+        self.snapshots = {}
+        # Called with what changed in the lists, after they are merged, see changes.diffLists
+        self.onChanges = None
+        self._changes = []
 
         self.host = host
         self.agency = agency
@@ -46,83 +102,309 @@ class Library:
         self.user.date = self.user.userId[:-4]
         self.municipality = libraryName
 
-    # The update function is called from the coordinator from Home Assistant
-    def update(self):
-        _LOGGER.debug(f"Updating ({self.user.date}) {self.use_eReolen}, {self.get_loans}, {self.get_reservations}, {self.get_depts}")
-
-        # Only fetch user info once
-        if not self.user.name:
-            self._branchName(self.agency)
-            self.fetchUserInfo()
-
-        # Fetch the states of the user
+    @property
+    def categories(self):
+        # The categories of this account, the profile always and the others when shown
+        categories = [CATEGORY_PROFILE]
         if self.get_loans:
-            self.fetchLoans()
+            categories.append(CATEGORY_LOANS)
         if self.get_reservations:
-            self.fetchReservations()
+            categories.append(CATEGORY_RESERVATIONS)
         if self.get_depts:
-            self.fetchDebts()
+            categories.append(CATEGORY_DEBTS)
+        if self.use_eReolen:
+            categories.append(CATEGORY_EREOLEN)
+        return categories
+
+    # Refresh every category at the same time, like the coordinators of Home Assistant do at startup
+    async def update(self):
+        _LOGGER.debug(f"Updating ({self.user.date}) {self.categories}")
+
+        # Login before anything else, all the categories use the same token
+        await self.user_token()
+
+        # A category failing keeps its last data, the others are updated anyway
+        categories = self.categories
+        results = await asyncio.gather(*(self.refresh(category) for category in categories), return_exceptions=True)
+        for category, result in zip(categories, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning("(%s) could not refresh the %s, keeping the last data: %s", self.user.date, category, result)
+        return True
 
-        # Sort the lists
-        self.sortLists()
+    # Refresh a single category, each category is refreshed at its own pace by Home Assistant
+    async def refresh(self, category):
+        _LOGGER.debug(f"Refreshing {category} ({self.user.date})")
+        if category == CATEGORY_PROFILE:
+            await self._tracked(category, self.fetchUserInfo())
+        elif category == CATEGORY_LOANS:
+            await self._tracked(category, self.fetchLoans())
+        elif category == CATEGORY_RESERVATIONS:
+            await self._tracked(category, self.fetchReservations())
+        elif category == CATEGORY_DEBTS:
+            await self._tracked(category, self.fetchDebts())
+        elif category == CATEGORY_EREOLEN:
+            await self._tracked(category, self.fetchEReolen())
+        self.mergeLists()
         return True
 
+    def refreshedAt(self, category):
+        # When the category was last refreshed, None if it never was
+        snapshot = self.snapshots.get(category)
+        return snapshot['updated'] if snapshot else None
+
+    def dataAge(self, category):
+        # Time since the category was last refreshed, None if it never was
+        updated = self.refreshedAt(category)
+        return datetime.now() - updated if updated else None
+
+    def isStale(self, category):
+        snapshot = self.snapshots.get(category)
+        return snapshot is None or snapshot['stale']
+
     # PRIVATE BEGIN ####
-    def sortLists(self):
-        # Sort the loans by expireDate and the Title
-        self.user.loans.sort(key=lambda obj: (obj.expireDate is None, obj.expireDate, obj.title))
+    async def _tracked(self, category, awaitable):
+        # Record the outcome of refreshing a category, a failure leaves its last lists in place
+        # The lists are replaced by the fetch, so the last ones are kept to tell what changed
+        before = self.lists.get(category) if category in DIFF_CATEGORIES and self.dataAge(category) is not None else None
+        try:
+            result = await awaitable
+        except Exception:
+            self.snapshots[category] = self._snapshot(category, False)
+            raise
+        self.snapshots[category] = self._snapshot(category, True)
+        if before is not None:
+            self._changes += diffLists(before, self.lists[category])
+        return result
+
+    def _snapshot(self, category, ok):
+        updated = datetime.now() if ok else (self.snapshots.get(category) or {}).get('updated')
+        return {'updated': updated, 'stale': not ok}
+
+    async def _request(self, method, url, **kwargs) -> ApiResponse:
+        # Every call goes through the shared transport, with the cookies of this user
+        res = await self.transport.request(self.session, method, url, metrics=self.metrics, **kwargs)
+        if res.status == 401 and 'Authorization' in (kwargs.get('headers') or {}):
+            # The token was not accepted (a restored token may have been revoked), so the session
+            # may have expired too, login with the form on the next call
+            _LOGGER.debug("(%s) token rejected by %s", self.user.date, url)
+            self._user_token = ''
+            self.loggedIn = ''
+            self.session.cookie_jar.clear()
+        return res
+
+    def mergeLists(self):
+        generations = dict(self.generations)
+        # The lists of the user combine the physical materials and eReolen
+        merged = {
+            'loans': self.lists[CATEGORY_LOANS]['loans'] + self.lists[CATEGORY_EREOLEN]['loans'],
+            'loansOverdue': list(self.lists[CATEGORY_LOANS]['loansOverdue']),
+            'reservations': self.lists[CATEGORY_RESERVATIONS]['reservations'] + self.lists[CATEGORY_EREOLEN]['reservations'],
+            'reservationsReady': list(self.lists[CATEGORY_RESERVATIONS]['reservationsReady']),
+            'debts': list(self.lists[CATEGORY_DEBTS]['debts']),
+        }
+        self.sortLists(merged)
+        for name, items in merged.items():
+            # An unchanged list keeps its generation
+            if items != getattr(self.user, name):
+                setattr(self.user, name, items)
+                self.generations[name] += 1
+        self.user.debtsAmount = sum([float(obj.feeAmount) for obj in self.user.debts])
+        profile = (
+            self.user.name, self.user.address, self.user.phone, self.user.phoneNotify, self.user.mail,
+            self.user.mailNotify, self.user.pickupLibrary, self.user.eBooks, self.user.eBooksQuota,
+            self.user.audioBooks, self.user.audioBooksQuota,
+        )
+        if profile != self._profile:
+            self._profile = profile
+            self.generations['profile'] += 1
+        # Told once the lists of the user show the changes
+        changes, self._changes = self._changes, []
+        if changes and self.onChanges is not None:
+            self.onChanges(changes)
+        if generations != self.generations and self.onState:
+            self.onState()
+
+    @property
+    def storedState(self):
+        # The profile and the lists per category, with when each category was refreshed
+        return {
+            'library': {name: getattr(self, name) for name in _LIBRARY_FIELDS},
+            'profile': {name: getattr(self.user, name) for name in _PROFILE_FIELDS},
+            'lists': {
+                category: {name: [_dumpMaterial(obj) for obj in objs] for name, objs in lists.items()}
+                for category, lists in self.lists.items()
+            },
+            'updated': {
+                category: snapshot['updated'].isoformat()
+                for category, snapshot in self.snapshots.items() if snapshot['updated']
+            },
+        }
+
+    def restoreState(self, data):
+        # Show the lists of the last run until the first refresh, as stale data of the time they were refreshed
+        if not data:
+            return
+        try:
+            lists = {
+                category: {name: [_loadMaterial(_MATERIALS[name], obj) for obj in objs] for name, objs in stored.items()}
+                for category, stored in data['lists'].items() if category in self.lists
+            }
+            updated = {category: datetime.fromisoformat(value) for category, value in data['updated'].items()}
+            library, profile = data['library'], data['profile']
+        except (AttributeError, KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("(%s) could not restore the stored state: %s", self.user.date, err)
+            return
+        for name in _LIBRARY_FIELDS:
+            setattr(self, name, library.get(name))
+        for name in _PROFILE_FIELDS:
+            if name in profile:
+                setattr(self.user, name, profile[name])
+        self.lists.update(lists)
+        self.snapshots = {category: {'updated': value, 'stale': True} for category, value in updated.items()}
+        self.mergeLists()
+
+    def keepCategories(self, categories):
+        # Empty the lists of the other categories, restored from before they were turned off
+        for category in self.lists.keys() - set(categories):
+            self.lists[category] = {name: [] for name in self.lists[category]}
+            self.snapshots.pop(category, None)
+        self.mergeLists()
+
+    def summary(self, today: date | None = None) -> dict:
+        # Built once per generation of the lists and per day, not by every sensor or template reading it
+        today = today or date.today()
+        key = (tuple(self.generations.values()), today)
+        if key != self._summaryKey:
+            self._summary = summarize(self.user, today)
+            self._summaryKey = key
+        return self._summary
+
+    def sortLists(self, lists):
+        # Sort the loans by expireDate and the Title, a material the catalogue does not know has no title
+        lists['loans'].sort(key=lambda obj: (obj.expireDate is None, obj.expireDate, obj.title or ''))
         # Sort the reservations
-        self.user.reservations.sort(
+        lists['reservations'].sort(
             key=lambda obj: (
                 obj.queueNumber is None,
                 obj.queueNumber,
                 obj.createdDate is None,
                 obj.createdDate,
-                obj.title,
+                obj.title or '',
             )
         )
         # Sort the reservations
-        self.user.reservationsReady.sort(key=lambda obj: (obj.pickupDate is None, obj.pickupDate, obj.title))
+        lists['reservationsReady'].sort(key=lambda obj: (obj.pickupDate is None, obj.pickupDate, obj.title or ''))
 
-    def _branchName(self, id):
+    async def _branchName(self, id):
         id = str(id).split('-')[-1]
-        if id in self.branches:
-            return self.branches[id]
-
-        params = {
-            'query': branch_query,
-            'variables': {'language': "DA", 'limit': 50, 'q': id}
-        }
-        header = {'Accept': '*/*'}
-        res = self.session.post("https://bibliotek.dk/api/bibdk21/graphql", headers=header, json=params)
-        if res.status_code == 200:
-            data = res.json()['data']['branches']
-            for branch in data['result']:
-                self.branches[branch['branchId']] = branch['name']
+        # Only goes to the network when the directory of the agency is missing or expired
+        await self.branches.async_load(self._request)
         return self.branches.get(id, id)
 
-    def _getDetails(self, faust):
-        if faust in self._details:
-            return self._details[faust]
-        data = {}
+    async def _getDetails(self, faust):
+        # Counted as a hit or a miss by _prefetchDetails, which the fetches call first
+        cached = self.cache.peek(CACHE_DETAILS, faust)
+        if cached is not None:
+            return cached
+        if self.cache.isMissing(CACHE_DETAILS, faust):
+            return None
         params = {"query": details_query, "variables": {"faust": faust}}
-        url = self.urls.get('data-fbi-global-base-url', "https://temp.fbi-api.dbc.dk/next-present/graphql")
-        res = self.session.post(url, headers=self.json_header, json=params)
-        if res.status_code == 200:
-            data = res.json()['data']
-            self._details[faust] = data
-        else:
-            _LOGGER.error(f"Error getting details for material: '{faust}'")
-        return self._details[faust]
+        url = (await self.urls()).get('data-fbi-global-base-url', "https://temp.fbi-api.dbc.dk/next-present/graphql")
+        res = await self._request("POST", url, headers=await self.json_header(), json=params, endpoint="details")
+        # Only an answer without the material marks it missing, a failed lookup leaves the category stale
+        data = res.raise_for_status().json()['data']
+        # Only keep materials that were found, the cache outlives a restart
+        if not data.get('manifestation'):
+            self.cache.setMissing(CACHE_DETAILS, faust)
+            return None
+        self.cache.set(CACHE_DETAILS, faust, data)
+        return data
+
+    async def _prefetchDetails(self, fausts):
+        # Resolve the uncached materials in batches, using aliased manifestation fields
+        missing = [
+            faust for faust in dict.fromkeys(fausts)
+            if not self.cache.isMissing(CACHE_DETAILS, faust) and self.cache.get(CACHE_DETAILS, faust) is None
+        ]
+        if not missing:
+            return
+        url = (await self.urls()).get('data-fbi-global-base-url', "https://temp.fbi-api.dbc.dk/next-present/graphql")
+        for start in range(0, len(missing), self.details_batch_size):
+            batch = missing[start:start + self.details_batch_size]
+            params = {
+                "query": _detailsBatchQuery(len(batch)),
+                "variables": {f"faust{n}": faust for n, faust in enumerate(batch)},
+            }
+            res = await self._request("POST", url, headers=await self.json_header(), json=params, endpoint="details_batch")
+            data = res.json().get('data') if res.status == 200 else None
+            if data is not None:
+                for n, faust in enumerate(batch):
+                    # Same shape as the single lookup, so libraryMaterial can parse it
+                    if data.get(f'm{n}'):
+                        self.cache.set(CACHE_DETAILS, faust, {'manifestation': data[f'm{n}']})
+                    elif f'm{n}' in data:
+                        # Only a material answered as null is unknown
+                        self.cache.setMissing(CACHE_DETAILS, faust)
+            else:
+                # Not marked missing, like a GraphQL error without data, they are looked up one by one instead
+                _LOGGER.warning(f"Error getting details for {len(batch)} materials, status {res.status}")
+
+    async def _getProduct(self, id):
+        # eReolen metadata rarely changes, so it is cached like the material details
+        cached = self.cache.get(CACHE_PRODUCTS, id)
+        if cached is not None:
+            return cached
+        if self.cache.isMissing(CACHE_PRODUCTS, id):
+            return None
+        async with self._productWorkers:
+            res = await self._request("GET", f'https://pubhub-openplatform.dbc.dk/v1/products/{id}', headers=await self.json_header(), endpoint="products")
+        if res.status == 404:
+            self.cache.setMissing(CACHE_PRODUCTS, id)
+            return None
+        # Any other failure leaves the category stale, instead of marking the product missing
+        product = res.raise_for_status().json()['product']
+        self.cache.set(CACHE_PRODUCTS, id, product)
+        return product
+
+    async def _getProducts(self, ids):
+        # Look up the products concurrently, at most EREOLEN_WORKERS at a time
+        products = await asyncio.gather(*(self._getProduct(id) for id in ids))
+        return dict(zip(ids, products))
+
+    @staticmethod
+    def _loanIds(materials):
+        return [material['loanDetails']['recordId'] for material in materials]
+
+    @staticmethod
+    def _reservationIds(materials):
+        return [material['recordId'] for material in materials]
+
+    @staticmethod
+    def _debtIds(debts):
+        return [debt['materials'][0]['recordId'] for debt in debts if debt['materials']]
+
+    # The lists raise UpstreamError when not answered, so the category keeps its last data
+    async def _fetchLoansList(self):
+        res = await self._request("GET", "https://fbs-openplatform.dbc.dk/external/agencyid/patrons/patronid/loans/v2", headers=await self.json_header(), endpoint="loans")
+        return res.raise_for_status().json()
+
+    async def _fetchReservationsList(self):
+        res = await self._request("GET", "https://fbs-openplatform.dbc.dk/external/v1/agencyid/patrons/patronid/reservations/v2", headers=await self.json_header(), endpoint="reservations")
+        return res.raise_for_status().json()
+
+    async def _fetchDebtsList(self):
+        params = {'includepaid': 'false', 'includenonpayable': 'true'}
+        res = await self._request("GET", "https://fbs-openplatform.dbc.dk/external/agencyid/patron/patronid/fees/v2", params=params, headers=await self.json_header(), endpoint="fees")
+        return res.raise_for_status().json()
 
     # PRIVATE END  ####
 
-    def login(self):
+    async def login(self):
         if not self.loggedIn:
             url = self.host + URL_LOGIN_PAGE
 
-            res = self.session.get(url)
-            if res.status_code != 200:
+            res = await self._request("GET", url, endpoint="login_page")
+            if res.status != 200:
                 _LOGGER.error("f({self.user.date}) Failed to login to {url}")
                 return
 
@@ -142,275 +424,398 @@ class Library:
 
                 # Send the payload as POST and prepare a new soup
                 # Use the URL from the response since we have been directed
-                res2 = self.session.post(form["action"].replace("/login", res.url), data=payload)
-                res2.raise_for_status()
+                res2 = await self._request("POST", form["action"].replace("/login", res.url), data=payload, endpoint="login")
+                if res2.status >= 400:
+                    raise ValueError(f"login form returned {res2.status}")
 
 #            except (AttributeError, KeyError) as err:
             except Exception as err:
                 _LOGGER.error(f"Error processing the <form> tag and subtags ({url}). Error: ({err})")
 
-        self._set_tokens()
+        await self._set_tokens()
         if DEBUG:
             _LOGGER.debug("(%s) is logged in: %s", self.user.date, self.loggedIn)
         return self.loggedIn
 
-    def _set_tokens(self):
-        res = self.session.get(f"{self.host}/dpl-react/user-tokens")
-        if res.status_code == 200:
+    async def _set_tokens(self):
+        res = await self._request("GET", f"{self.host}/dpl-react/user-tokens", endpoint="user_tokens")
+        if res.status == 200:
             self._library_token = res.text.split('"library"')[1].split('"')[1]
             if '"user"' in res.text:
                 self.loggedIn = self.host + '/logout'
                 self._user_token = res.text.split('"user"')[1].split('"')[1]
-                self._user_token_exp = datetime.now() + timedelta(days=7)
+                self._user_token_exp = datetime.now() + TOKEN_LIFETIME
+                if self.onTokens:
+                    self.onTokens()
+            else:
+                # The session has expired, the next login posts the form again
+                self.loggedIn = ''
+
+    def _tokenValid(self):
+        return bool(self._user_token) and datetime.now() < self._user_token_exp
 
     @property
-    def json_header(self):
-        self._json_header["Authorization"] = f"Bearer {self.user_token}"
-        return self._json_header
+    def tokens(self):
+        return {
+            'user': self._user_token,
+            'library': self._library_token,
+            'expires': self._user_token_exp.isoformat(),
+            'urls': self._urls,
+        }
 
     @property
-    def user_token(self):
-        now = datetime.now() - timedelta(days=1)
-        if not self._user_token or self._user_token_exp < now:
-            self.login()
-            # _LOGGER.error(f'new user token {self._user_token_exp}')
+    def tokenExpires(self):
+        return self._user_token_exp
+
+    def restoreTokens(self, data):
+        # Reuse the tokens of an earlier login, the cookies of the login are not kept
+        if not data:
+            return
+        try:
+            expires = datetime.fromisoformat(data['expires'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if expires > datetime.now():
+            self._user_token = data.get('user', '')
+            self._library_token = data.get('library', '')
+            self._user_token_exp = expires
+            self._urls = data.get('urls') or self._urls
+
+    async def refreshTokens(self):
+        # Login again while the current token is still in use, the lock makes other calls wait for a missing token only
+        async with self._loginLock:
+            expires = self._user_token_exp
+            self.session.cookie_jar.clear()
+            self.loggedIn = ''
+            await self.login()
+            # The old token is still valid, so only a token set by this login counts as renewed
+            return self._user_token_exp != expires
+
+    async def json_header(self):
+        self._json_header["Authorization"] = f"Bearer {await self.user_token()}"
+        return self._json_header
+
+    async def user_token(self):
+        if not self._tokenValid():
+            # Concurrent lookups must wait for one login instead of starting their own
+            async with self._loginLock:
+                if not self._tokenValid():
+                    await self.login()
+                    # _LOGGER.error(f'new user token {self._user_token_exp}')
         return self._user_token
 
-    @property
-    def library_token(self):
-        now = datetime.now() - timedelta(days=1)
-        if not self._user_token or self._user_token_exp < now:
-            self.login()
-            # _LOGGER.error(f'new library token {self._user_token_exp}')
+    async def library_token(self):
+        await self.user_token()
         return self._library_token
 
-    @property
-    def urls(self):
-        if not self._urls:
-            res = self.session.get(f'{self.host}/user/me/loans')
-            if res.status_code == 200:
-                self._urls = {m[0]: m[1] for m in re.findall(r'(data-[a-zA-Z0-9\-\_]+-url)="([^"]*)"', res.text)}
+    async def urls(self):
+        async with self._urlsLock:
+            if not self._urls:
+                res = await self._request("GET", f'{self.host}/user/me/loans', endpoint="urls")
+                if res.status == 200:
+                    self._urls = {m[0]: m[1] for m in re.findall(r'(data-[a-zA-Z0-9\-\_]+-url)="([^"]*)"', res.text)}
         return self._urls
 
-    def logout(self):
+    async def close(self):
+        # Only the session of the user is closed, the connections stay in the pool
+        await self.session.close()
+
+    async def logout(self):
         if self.loggedIn:
             url = self.loggedIn
             # Fetch the logout page, if given a 200 (true) reverse it to false
-            self.loggedIn = not self.session.get(url).status_code == 200
+            self.loggedIn = not (await self._request("GET", url, endpoint="logout")).status == 200
             if not self.loggedIn:
-                self.session.close()
-                self.session = requests.Session()
-                self.session.headers = HEADERS
+                # Forget the cookies of the user, the session itself is reused
+                self.session.cookie_jar.clear()
         if DEBUG:
             _LOGGER.debug(f"({self.user.date}) is logged OUT @{url}: {~self.loggedIn}")
 
     # Get information on the user
-    def fetchUserInfo(self):
+    async def fetchUserInfo(self):
         # Fetch the user profile page
-        res = self.session.get('https://fbs-openplatform.dbc.dk/external/agencyid/patrons/patronid/v4', headers=self.json_header)
-        if res.status_code == 200:
-            try:
-                data = res.json()['patron']
-
-                self.user.name = data['name']
-                self.user.address = f'{data["address"]["street"]}\n{data["address"]["postalCode"]} {data["address"]["city"]}'
-                self.user.phone = data['phoneNumber']
-                self.user.phoneNotify = int(data['receiveSms'])
-                self.user.mail = data['emailAddress']
-                self.user.mailNotify = int(data['receiveEmail'])
-                self.user.pickupLibrary = self._branchName(data['preferredPickupBranch'])
-                self.libraryName = self._branchName(data['preferredPickupBranch'])
-            except (AttributeError, KeyError) as err:
-                _LOGGER.error(f"Error getting user info {self.user.dat}. Error: {err}")
+        res = await self._request("GET", 'https://fbs-openplatform.dbc.dk/external/agencyid/patrons/patronid/v4', headers=await self.json_header(), endpoint="patron")
+        # Like the lists, a failure keeps the last profile and leaves it stale
+        data = res.raise_for_status().json()
+        try:
+            data = data['patron']
+
+            self.user.name = data['name']
+            self.user.address = f'{data["address"]["street"]}\n{data["address"]["postalCode"]} {data["address"]["city"]}'
+            self.user.phone = data['phoneNumber']
+            self.user.phoneNotify = int(data['receiveSms'])
+            self.user.mail = data['emailAddress']
+            self.user.mailNotify = int(data['receiveEmail'])
+            self.user.pickupLibrary = await self._branchName(data['preferredPickupBranch'])
+            self.libraryName = await self._branchName(data['preferredPickupBranch'])
+        except (AttributeError, KeyError) as err:
+            _LOGGER.error(f"Error getting user info {self.user.date}. Error: {err}")
 
     # Get the loans with all possible details
-    def fetchLoans(self):
+    async def fetchLoans(self):
         loans = []
         loansOverdue = []
 
         # Physical books
-        res = self.session.get("https://fbs-openplatform.dbc.dk/external/agencyid/patrons/patronid/loans/v2", headers=self.json_header)
-        if res.status_code == 200:
-            for material in res.json():
-                id = material['loanDetails']['recordId']
-                data = self._getDetails(id)
-                if data:
-                    # Create an instance of libraryLoan
-                    obj = libraryLoan(data)
-
-                    # Renewable
-                    obj.renewId = material['loanDetails']['loanId']
-                    obj.renewAble = material['isRenewable']
-                    obj.loanDate = parser.parse(material['loanDetails']['loanDate'], ignoretz=True)
-                    obj.expireDate = parser.parse(material['loanDetails']['dueDate'], ignoretz=True) + timedelta(hours=23, minutes=59)
-                    obj.id = material['loanDetails']['materialItemNumber']
-                    if obj.expireDate < datetime.now():
-                        loansOverdue.append(obj)
-                    else:
-                        loans.append(obj)
-        # Ebooks
-        if self.use_eReolen:
-            res = self.session.get('https://pubhub-openplatform.dbc.dk/v1/user/loans', headers=self.json_header)
-            if res.status_code == 200:
-                edata = res.json()
-
-                self.user.eBooks = edata['userData']['totalEbookLoans']
-                self.user.eBooksQuota = edata['libraryData']['maxConcurrentEbookLoansPerBorrower']
-                self.user.audioBooks = edata['userData']['totalAudioLoans']
-                self.user.audioBooksQuota = edata['libraryData']['maxConcurrentAudiobookLoansPerBorrower']
-
-                for material in edata['loans']:
-                    id = material['libraryBook']['identifier']
-                    res2 = self.session.get(f'https://pubhub-openplatform.dbc.dk/v1/products/{id}', headers=self.json_header)
-                    if res2.status_code == 200:
-                        data = res2.json()['product']
-                        obj = libraryLoan(data)
-
-                        # Details
-                        obj.id = id
-                        obj.loanDate = parser.parse(material['orderDateUtc'], ignoretz=True)
-                        obj.orderId = material['orderId']
-                        obj.expireDate = parser.parse(material['loanExpireDateUtc'], ignoretz=True)
-                        loans.append(obj)
-        else:
-            self.user.eBooks = 0
-            self.user.eBooksQuota = 0
-            self.user.audioBooks = 0
-            self.user.audioBooksQuota = 0
-
-        self.user.loans = loans
-        self.user.loansOverdue = loansOverdue
+        materials = await self._fetchLoansList()
+        await self._prefetchDetails(self._loanIds(materials))
+        for material in materials:
+            id = material['loanDetails']['recordId']
+            # A material the catalogue does not know is kept, without title and cover
+            data = await self._getDetails(id) or {}
+            # Create an instance of libraryLoan
+            obj = libraryLoan.fromData(data)
+
+            # Renewable
+            obj.renewId = material['loanDetails']['loanId']
+            obj.renewAble = material['isRenewable']
+            obj.loanDate = parseDate(material['loanDetails']['loanDate'])
+            obj.expireDate = parseDate(material['loanDetails']['dueDate']) + timedelta(hours=23, minutes=59)
+            obj.id = material['loanDetails']['materialItemNumber']
+            if obj.expireDate < datetime.now():
+                loansOverdue.append(obj)
+            else:
+                loans.append(obj)
+
+        self.lists[CATEGORY_LOANS] = {'loans': loans, 'loansOverdue': loansOverdue}
 
     # Get the current reservations
-    def fetchReservations(self):
+    async def fetchReservations(self):
         reservations = []
         reservationsReady = []
 
         # Physical books
-        res = self.session.get("https://fbs-openplatform.dbc.dk/external/v1/agencyid/patrons/patronid/reservations/v2", headers=self.json_header)
-        materials = {item['transactionId']: item for item in res.json()}  # make sure only to take last if more than one item with same transaction
+        materials = await self._fetchReservationsList()
+        await self._prefetchDetails(self._reservationIds(materials))
+        materials = {item['transactionId']: item for item in materials}  # make sure only to take last if more than one item with same transaction
         for material in materials.values():
             id = material['recordId']
-            data = self._getDetails(id)
-            if data:
-                if material['state'] == 'readyForPickup':
-                    obj = libraryReservationReady(data)
-                else:
-                    obj = libraryReservation(data)
-
-                # Details
-                obj.id = id
-                obj.createdDate = parser.parse(material['dateOfReservation'], ignoretz=True)
-                obj.pickupLibrary = self._branchName(material['pickupBranch'])
-                if material['state'] == 'readyForPickup':
-                    obj.reservationNumber = material['pickupNumber']
-                    obj.pickupDate = parser.parse(material['pickupDeadline'], ignoretz=True)
-                    reservationsReady.append(obj)
-                else:
-                    obj.expireDate = parser.parse(material['expiryDate'], ignoretz=True)
-                    obj.queueNumber = material['numberInQueue']
-                    reservations.append(obj)
-
-        # eReolen
-        if self.use_eReolen:
-            res = self.session.get("https://pubhub-openplatform.dbc.dk/v1/user/reservations", headers=self.json_header)
-            if res.status_code == 200:
-                edata = res.json()
-                for material in edata['reservations']:
-                    _LOGGER.debug(f"E-reol reservering data {material}")
-                    id = material['identifier']
-                    res2 = self.session.get(f'https://pubhub-openplatform.dbc.dk/v1/products/{id}', headers=self.json_header)
-                    if res2.status_code == 200:
-                        data = res2.json()['product']
-                        _LOGGER.debug(f"E-reol reservering data {res.json()}")
-
-                        obj = libraryReservation(data)
-                        obj.id = id
-
-                        obj.expireDate = parser.parse(material['expectedRedeemDateUtc'])
-                        obj.createdDate = parser.parse(material['createdDateUtc'])
-                        obj.pickupLibrary = 'ereolen.dk'
-                        reservations.append(obj)
-        self.user.reservations = reservations
-        self.user.reservationsReady = reservationsReady
+            # A material the catalogue does not know is kept, without title and cover
+            data = await self._getDetails(id) or {}
+            if material['state'] == 'readyForPickup':
+                obj = libraryReservationReady.fromData(data)
+            else:
+                obj = libraryReservation.fromData(data)
+
+            # Details
+            obj.id = id
+            obj.transactionId = material['transactionId']
+            obj.createdDate = parseDate(material['dateOfReservation'])
+            obj.pickupLibrary = await self._branchName(material['pickupBranch'])
+            if material['state'] == 'readyForPickup':
+                obj.reservationNumber = material['pickupNumber']
+                obj.pickupDate = parseDate(material['pickupDeadline'])
+                reservationsReady.append(obj)
+            else:
+                obj.expireDate = parseDate(material['expiryDate'])
+                obj.queueNumber = material['numberInQueue']
+                reservations.append(obj)
+
+        self.lists[CATEGORY_RESERVATIONS] = {'reservations': reservations, 'reservationsReady': reservationsReady}
+
+    # Get the loans and reservations from eReolen
+    async def fetchEReolen(self):
+        if not self.use_eReolen:
+            self.user.eBooks = 0
+            self.user.eBooksQuota = 0
+            self.user.audioBooks = 0
+            self.user.audioBooksQuota = 0
+            self.lists[CATEGORY_EREOLEN] = {'loans': [], 'reservations': []}
+            return
+        loans, reservations = await asyncio.gather(self._fetchELoans(), self._fetchEReservations())
+        self.lists[CATEGORY_EREOLEN] = {'loans': loans, 'reservations': reservations}
+
+    # Like the lists of fbs-openplatform, a failure keeps the last eReolen lists
+    async def _fetchELoans(self):
+        loans = []
+        res = await self._request("GET", 'https://pubhub-openplatform.dbc.dk/v1/user/loans', headers=await self.json_header(), endpoint="ereolen_loans")
+        edata = res.raise_for_status().json()
+
+        self.user.eBooks = edata['userData']['totalEbookLoans']
+        self.user.eBooksQuota = edata['libraryData']['maxConcurrentEbookLoansPerBorrower']
+        self.user.audioBooks = edata['userData']['totalAudioLoans']
+        self.user.audioBooksQuota = edata['libraryData']['maxConcurrentAudiobookLoansPerBorrower']
+
+        products = await self._getProducts([material['libraryBook']['identifier'] for material in edata['loans']])
+        for material in edata['loans']:
+            id = material['libraryBook']['identifier']
+            data = products[id] or {}
+            obj = libraryLoan.fromData(data)
+
+            # Details
+            obj.id = id
+            obj.loanDate = parseDate(material['orderDateUtc'], utc=True)
+            obj.orderId = material['orderId']
+            obj.expireDate = parseDate(material['loanExpireDateUtc'], utc=True)
+            loans.append(obj)
+        return loans
+
+    async def _fetchEReservations(self):
+        reservations = []
+        res = await self._request("GET", "https://pubhub-openplatform.dbc.dk/v1/user/reservations", headers=await self.json_header(), endpoint="ereolen_reservations")
+        edata = res.raise_for_status().json()
+        products = await self._getProducts([material['identifier'] for material in edata['reservations']])
+        for material in edata['reservations']:
+            _LOGGER.debug(f"E-reol reservering data {material}")
+            id = material['identifier']
+            data = products[id] or {}
+            _LOGGER.debug(f"E-reol reservering data {data}")
+
+            obj = libraryReservation.fromData(data)
+            obj.id = id
+
+            obj.expireDate = parseDate(material['expectedRedeemDateUtc'], utc=True)
+            obj.createdDate = parseDate(material['createdDateUtc'], utc=True)
+            obj.pickupLibrary = 'ereolen.dk'
+            reservations.append(obj)
+        return reservations
 
     # Get debts, if any, from the Library
-    def fetchDebts(self):
+    async def fetchDebts(self):
         debts = []
-        params = {'includepaid': 'false', 'includenonpayable': 'true'}
-        res = self.session.get("https://fbs-openplatform.dbc.dk/external/agencyid/patron/patronid/fees/v2", params=params, headers=self.json_header)
-        if res.status_code == 200:
-            js = res.json()
-            for debt in js:
-                # TODO more than one material?
-                material = debt['materials'][0]
-                id = material['recordId']
-                data = self._getDetails(id)
-                if data:
-                    obj = libraryDebt(data)
-
-                    obj.feeDate = parser.parse(debt['creationDate'], ignoretz=True)
-                    obj.feeDueDate = parser.parse(debt['dueDate'], ignoretz=True)
-                    obj.feeAmount = debt['amount']
-                    debts.append(obj)
-        self.user.debts = debts
-        self.user.debtsAmount = sum([float(obj.feeAmount) for obj in debts])
-
-
-class libraryUser:
-    userInfo = None
-    name, address = None, None
-    phone, phoneNotify, mail, mailNotify = None, None, None, None
-    loans, loansOverdue, reservations, reservationsReady, debts = [], [], [], [], []
-    debtsAmount = 0.0
-    eBooks, eBooksQuota, audioBooks, audioBooksQuota = 0, 0, 0, 0
-    pickupLibrary = None
+        js = await self._fetchDebtsList()
+        await self._prefetchDetails(self._debtIds(js))
+        for debt in js:
+            # TODO more than one material?
+            material = debt['materials'][0]
+            id = material['recordId']
+            # A material the catalogue does not know is kept, without title and cover
+            data = await self._getDetails(id) or {}
+            obj = libraryDebt.fromData(data)
 
-    def __init__(self, userId: str, pincode: str) -> None:
-        self.userInfo = {"loginBibDkUserId": userId, "pincode": pincode}
-        self.userId = userId
+            obj.feeDate = parseDate(debt['creationDate'])
+            obj.feeDueDate = parseDate(debt['dueDate'])
+            obj.feeAmount = debt['amount']
+            obj.feeType = debt.get('type')
+            debts.append(obj)
+        self.lists[CATEGORY_DEBTS] = {'debts': debts}
 
 
+@dataclass(slots=True)
+class libraryUser:
+    userId: str = field(repr=False)
+    pincode: InitVar[str]
+    # The login form fields, holding the CPR number and pincode
+    userInfo: dict = field(init=False, repr=False)
+    date: str = ''
+    name: str | None = None
+    address: str | None = None
+    phone: str | None = None
+    phoneNotify: int | None = None
+    mail: str | None = None
+    mailNotify: int | None = None
+    # Every user gets lists of its own
+    loans: list = field(default_factory=list)
+    loansOverdue: list = field(default_factory=list)
+    reservations: list = field(default_factory=list)
+    reservationsReady: list = field(default_factory=list)
+    debts: list = field(default_factory=list)
+    debtsAmount: float = 0.0
+    eBooks: int = 0
+    eBooksQuota: int = 0
+    audioBooks: int = 0
+    audioBooksQuota: int = 0
+    pickupLibrary: str | None = None
+
+    def __post_init__(self, pincode):
+        self.userInfo = {"loginBibDkUserId": self.userId, "pincode": pincode}
+
+
+@dataclass(slots=True)
 class libraryMaterial:
-    id = None
-    type, title, creators = None, None, None
-    url, coverUrl = None, None
-
-    def __init__(self, data):
+    id: str | None = None
+    type: str | None = None
+    title: str | None = None
+    creators: str | None = None
+    url: str | None = None
+    coverUrl: str | None = None
+
+    @classmethod
+    def fromData(cls, data):
+        # From the details of a physical material or an eReolen product
+        obj = cls()
         try:
             if 'thumbnailUri' in data:
                 # from ereol
-                self.coverUrl = data['thumbnailUri']
-                self.title = data['title']
-                self.creators = ' og '.join([item['firstName'] + item['lastName'] for item in data['contributors']])
-                self.type = data['format']
+                obj.coverUrl = data['thumbnailUri']
+                obj.title = data['title']
+                obj.creators = ' og '.join([item['firstName'] + item['lastName'] for item in data['contributors']])
+                obj.type = sys.intern(data['format'])
             elif 'manifestation' in data:
                 # physical book
-                self.coverUrl = data['manifestation']['cover']['thumbnail']
-                self.title = data['manifestation']['titles']['full'][0]  # or main
+                obj.coverUrl = data['manifestation']['cover']['thumbnail']
+                obj.title = data['manifestation']['titles']['full'][0]  # or main
                 if data['manifestation']['creators']:
-                    self.creators = data['manifestation']['creators'][0]['display']
-                self.type = data['manifestation']['materialTypes'][0]['materialTypeSpecific']['display']
+                    obj.creators = data['manifestation']['creators'][0]['display']
+                # The few material types are shared by all the materials
+                obj.type = sys.intern(data['manifestation']['materialTypes'][0]['materialTypeSpecific']['display'])
         except Exception as err:
             _LOGGER.error(f'Failed to set material data, {err}')
             _LOGGER.error(f'{data}')
+        return obj
 
 
+@dataclass(slots=True)
 class libraryLoan(libraryMaterial):
-    loanDate, expireDate = None, None
-    renewId, renewAble = None, None
-    orderId = None
+    loanDate: datetime | None = None
+    expireDate: datetime | None = None
+    renewId: int | None = None
+    renewAble: bool | None = None
+    orderId: str | None = None
 
 
+@dataclass(slots=True)
 class libraryReservation(libraryMaterial):
-    createdDate, expireDate, queueNumber = None, None, None
-    pickupLibrary = None
+    createdDate: datetime | None = None
+    expireDate: datetime | None = None
+    queueNumber: int | None = None
+    pickupLibrary: str | None = None
+    transactionId: str | None = None
 
 
+@dataclass(slots=True)
 class libraryReservationReady(libraryMaterial):
-    createdDate, pickupDate, reservationNumber = None, None, None
-    pickupLibrary = None
+    createdDate: datetime | None = None
+    pickupDate: datetime | None = None
+    reservationNumber: str | None = None
+    pickupLibrary: str | None = None
+    transactionId: str | None = None
 
 
+@dataclass(slots=True)
 class libraryDebt(libraryMaterial):
-    feeDate, feeDueDate, feeAmount = None, None, None
+    feeDate: datetime | None = None
+    feeDueDate: datetime | None = None
+    feeAmount: float | None = None
+    feeType: str | None = None
+
+
+# What is stored of the client and its user, see AsyncLibrary.storedState
+_LIBRARY_FIELDS = ('libraryName',)
+_PROFILE_FIELDS = (
+    'name', 'address', 'phone', 'phoneNotify', 'mail', 'mailNotify', 'pickupLibrary',
+    'eBooks', 'eBooksQuota', 'audioBooks', 'audioBooksQuota',
+)
+# The material of each list of the user
+_MATERIALS = {
+    'loans': libraryLoan,
+    'loansOverdue': libraryLoan,
+    'reservations': libraryReservation,
+    'reservationsReady': libraryReservationReady,
+    'debts': libraryDebt,
+}
+
+
+def _dumpMaterial(obj):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in asdict(obj).items()}
+
+
+def _loadMaterial(cls, data):
+    values = {}
+    for item in fields(cls):
+        value = data.get(item.name)
+        # The annotations are strings, postponed by the __future__ import
+        if value is not None and item.type.startswith('datetime'):
+            value = datetime.fromisoformat(value)
+        values[item.name] = value
+    return cls(**values)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+
+from .const import METRICS_BUCKETS
+
+
+class Metrics:
+    """Counts, latencies and sizes of the calls of an account, per endpoint.
+
+    Latencies are kept in a histogram with fixed buckets, so the registry stays
+    the same size however long Home Assistant runs. Everything is in memory and
+    starts over on a restart.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = METRICS_BUCKETS) -> None:
+        self._buckets = buckets
+        self._endpoints = {}
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = {
+                "count": 0,
+                "errors": 0,
+                "retries": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+                # The last bucket counts the calls slower than the largest bound
+                "histogram": [0] * (len(self._buckets) + 1),
+            }
+        return self._endpoints[endpoint]
+
+    def record(self, endpoint, seconds: float, size: int = 0, error: bool = False):
+        stats = self._endpoint(endpoint)
+        stats["count"] += 1
+        stats["errors"] += int(error)
+        stats["bytes"] += size
+        stats["seconds"] += seconds
+        stats["histogram"][bisect_left(self._buckets, seconds)] += 1
+
+    def retry(self, endpoint):
+        self._endpoint(endpoint)["retries"] += 1
+
+    def rejected(self, endpoint):
+        # Not sent because the circuit breaker of the host was open
+        self._endpoint(endpoint)["errors"] += 1
+
+    @property
+    def requests(self):
+        return sum(stats["count"] for stats in self._endpoints.values())
+
+    def percentile(self, endpoint, fraction: float):
+        # Upper bound of the bucket holding the percentile, None without calls or when slower than every bound
+        stats = self._endpoints.get(endpoint)
+        if not stats or not stats["count"]:
+            return None
+        seen = 0
+        for bound, count in zip(self._buckets, stats["histogram"]):
+            seen += count
+            if seen >= fraction * stats["count"]:
+                return bound
+        return None
+
+    def summary(self):
+        return {
+            endpoint: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "retries": stats["retries"],
+                "bytes": stats["bytes"],
+                "mean_ms": round(1000 * stats["seconds"] / stats["count"]) if stats["count"] else 0,
+                "p95_ms": None if (p95 := self.percentile(endpoint, 0.95)) is None else round(1000 * p95),
+            }
+            for endpoint, stats in sorted(self._endpoints.items())
+        }
+
+    def as_dict(self):
+        return {
+            "buckets": list(self._buckets),
+            "endpoints": self._endpoints,
+        }
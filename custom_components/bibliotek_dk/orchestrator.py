@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime
+import asyncio
+import logging
+import random
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    ORCHESTRATOR_JITTER,
+    ORCHESTRATOR_TICK,
+    ORCHESTRATOR_WORKERS,
+)
+from .coordinator import LibraryCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RefreshOrchestrator:
+    """Schedules the refreshes of all the coordinators of the household.
+
+    The first refreshes are spread over the first interval and every later one
+    is jittered, so accounts set up together do not keep polling together. Due
+    refreshes are run most urgent first, a few at a time.
+    """
+
+    def __init__(self, hass: HomeAssistant, workers: int = ORCHESTRATOR_WORKERS) -> None:
+        self.hass = hass
+        self._workers = asyncio.Semaphore(workers)
+        # coordinator -> when it is due
+        self._due = {}
+        self._running = set()
+        self._unsub = None
+
+    @callback
+    def register(self, coordinator: LibraryCoordinator):
+        # Stagger the first scheduled refresh over the interval, the setup starts the initial one
+        self._due[coordinator] = datetime.now() + coordinator.nextInterval * random.uniform(0.5, 1.0)
+        if self._unsub is None:
+            self._unsub = async_track_time_interval(self.hass, self._tick, ORCHESTRATOR_TICK)
+
+        @callback
+        def unregister():
+            self._due.pop(coordinator, None)
+            if not self._due and self._unsub:
+                self._unsub()
+                self._unsub = None
+
+        return unregister
+
+    async def async_refresh(self, coordinators: list[LibraryCoordinator]):
+        """Refresh the coordinators now, most urgent first and a few at a time."""
+        coordinators = sorted(coordinators, key=lambda coordinator: coordinator.urgency)
+        await asyncio.gather(*(self._refresh(coordinator) for coordinator in coordinators))
+
+    @callback
+    def _tick(self, _now=None):
+        now = datetime.now()
+        due = [
+            coordinator for coordinator, when in self._due.items()
+            if when <= now and coordinator not in self._running
+        ]
+        if due:
+            _LOGGER.debug("%d refreshes due", len(due))
+            self.hass.async_create_task(self.async_refresh(due))
+
+    async def _refresh(self, coordinator: LibraryCoordinator):
+        self._running.add(coordinator)
+        try:
+            async with self._workers:
+                await coordinator.async_refresh()
+        finally:
+            self._running.discard(coordinator)
+        if coordinator in self._due:
+            jitter = random.uniform(1 - ORCHESTRATOR_JITTER, 1 + ORCHESTRATOR_JITTER)
+            self._due[coordinator] = datetime.now() + coordinator.nextInterval * jitter
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from .const import (
+    CATEGORY_DEBTS,
+    CATEGORY_EREOLEN,
+    CATEGORY_LOANS,
+    CATEGORY_PROFILE,
+    CATEGORY_RESERVATIONS,
+    POLLS_PER_DEADLINE,
+    PROFILE_UPDATE_INTERVAL,
+    QUEUE_FRONT_INTERVAL,
+)
+from .library_api import AsyncLibrary
+
+
+def deadlines(myLibrary: AsyncLibrary, category):
+    # Due dates of the loans and the last days to pick up the ready reservations of the category
+    lists = myLibrary.lists
+    if category in (CATEGORY_LOANS, CATEGORY_EREOLEN):
+        return [loan.expireDate for loan in lists[category]['loans'] if loan.expireDate]
+    if category == CATEGORY_RESERVATIONS:
+        return [reservation.pickupDate for reservation in lists[category]['reservationsReady'] if reservation.pickupDate]
+    return []
+
+
+def queueFront(myLibrary: AsyncLibrary, category):
+    reservations = myLibrary.lists.get(category, {}).get('reservations', [])
+    return any(reservation.queueNumber == 1 for reservation in reservations)
+
+
+def urgency(myLibrary: AsyncLibrary, category, now: datetime | None = None) -> timedelta:
+    # Time until the nearest deadline of the category, used to refresh the most urgent accounts first
+    now = now or datetime.now()
+    if queueFront(myLibrary, category):
+        return QUEUE_FRONT_INTERVAL
+    upcoming = [deadline - now for deadline in deadlines(myLibrary, category) if deadline > now]
+    return min(upcoming, default=timedelta.max)
+
+
+def nextUpdateInterval(
+    myLibrary: AsyncLibrary, category, minInterval: timedelta, maxInterval: timedelta, now: datetime | None = None
+) -> timedelta:
+    """Time until the next update of a category, shorter as its deadlines get close.
+
+    The nearest future deadline is polled POLLS_PER_DEADLINE times before it
+    passes, a reservation first in the queue at least every QUEUE_FRONT_INTERVAL,
+    and with nothing pending the interval backs off to maxInterval. Debts and
+    the profile have no deadlines and always use the long intervals.
+    """
+    if category == CATEGORY_PROFILE:
+        return max(maxInterval, PROFILE_UPDATE_INTERVAL)
+    if category == CATEGORY_DEBTS:
+        return maxInterval
+    now = now or datetime.now()
+    interval = maxInterval
+    for deadline in deadlines(myLibrary, category):
+        if deadline > now:
+            interval = min(interval, (deadline - now) / POLLS_PER_DEADLINE)
+    if queueFront(myLibrary, category):
+        interval = min(interval, QUEUE_FRONT_INTERVAL)
+    return max(minInterval, min(interval, maxInterval))
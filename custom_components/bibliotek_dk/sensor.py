@@ -3,22 +3,37 @@ from __future__ import annotations
 import logging
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.core import HomeAssistant
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 import hashlib
 
 from .const import (
+    ATTRIBUTE_LIMIT,
+    CACHE_AGENCIES,
+    CACHE_DETAILS,
+    CACHE_PRODUCTS,
+    CATEGORY_DEBTS,
+    CATEGORY_EREOLEN,
+    CATEGORY_LOANS,
+    CATEGORY_PROFILE,
+    CATEGORY_RESERVATIONS,
+    CONF_ATTRIBUTE_LIMIT,
+    CONF_MAX_UPDATE_INTERVAL,
     CONF_UPDATE_INTERVAL,
     CREDITS,
+    DATA_HOUSEHOLD,
     DOMAIN,
     CONF_SHOW_LOANS,
     CONF_SHOW_ELOANS,
     CONF_SHOW_DEBTS,
     CONF_SHOW_RESERVATIONS,
+    MAX_UPDATE_INTERVAL,
+    SIGNAL_UPDATED,
 )
 from homeassistant.const import (
     ATTR_ATTRIBUTION,
@@ -26,79 +41,208 @@ from homeassistant.const import (
     ATTR_ENTITY_PICTURE,
 )
 
-from .library_api import Library, libraryUser
+from . import async_get_libraries, async_get_orchestrator
+from .aggregates import combine
+from .coordinator import LibraryCoordinator
+from .items import ITEM_LISTS, iso
+from .library_api import AsyncLibrary
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 _LOGGER = logging.getLogger(__name__)
 
+# The categories in the names of the sensors
+CATEGORY_NAMES = {
+    CATEGORY_PROFILE: "profil",
+    CATEGORY_LOANS: "lån",
+    CATEGORY_RESERVATIONS: "reservationer",
+    CATEGORY_DEBTS: "gebyrer",
+    CATEGORY_EREOLEN: "eReolen",
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
 
-    # Define a update function
-    async def async_update_data():
-        # Retrieve the client stored in the hass data stack
-        myLibrary = hass.data[DOMAIN][entry.entry_id]
-        # Call, and wait for it to finish, the function with the refresh procedure
-        await hass.async_add_executor_job(myLibrary.update)
-
-    # Create a coordinator
     new_data = {**entry.data, **entry.options}
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="sensor",
-        update_method=async_update_data,
-        update_interval=timedelta(minutes=int(new_data[CONF_UPDATE_INTERVAL])),
-    )
+    minInterval = timedelta(minutes=int(new_data[CONF_UPDATE_INTERVAL]))
+    maxInterval = timedelta(minutes=int(new_data.get(CONF_MAX_UPDATE_INTERVAL, MAX_UPDATE_INTERVAL)))
     myLibrary = hass.data[DOMAIN][entry.entry_id]
     myLibrary.use_eReolen = new_data.get(CONF_SHOW_ELOANS, True)
     myLibrary.get_loans = new_data[CONF_SHOW_LOANS]
     myLibrary.get_depts = new_data[CONF_SHOW_DEBTS]
     myLibrary.get_reservations = new_data[CONF_SHOW_RESERVATIONS]
 
-    # Immediate refresh
-    await coordinator.async_request_refresh()
+    # Create a coordinator per category, so each category is refreshed at its own pace
+    categories = myLibrary.categories
+    myLibrary.keepCategories(categories)
+    coordinators = {
+        category: LibraryCoordinator(hass, myLibrary, category, minInterval, maxInterval)
+        for category in categories
+    }
+
+    def listen(*categories):
+        return [coordinators[category] for category in categories if category in coordinators]
+
+    orchestrator = async_get_orchestrator(hass)
+    first = list(coordinators.values())
+    if not myLibrary.user.name:
+        # Nothing stored yet, the names of the entities need the profile
+        await orchestrator.async_refresh([coordinators[CATEGORY_PROFILE]])
+        first.remove(coordinators[CATEGORY_PROFILE])
+    for coordinator in coordinators.values():
+        # Tell the household sensor, which covers every account
+        entry.async_on_unload(coordinator.async_add_listener(lambda: async_dispatcher_send(hass, SIGNAL_UPDATED)))
+
+    # Materials per list in the attributes, the rest is served by the get_items service
+    attributeLimit = int(new_data.get(CONF_ATTRIBUTE_LIMIT, ATTRIBUTE_LIMIT))
 
     sensors = []
 
     # Library
-    sensors.append(LibrarySensor(myLibrary, coordinator))
+    sensors.append(LibrarySensor(myLibrary, list(coordinators.values())))
 
     # Loans
     if True:  # new_data[CONF_SHOW_LOANS]:
-        sensors.append(LoanSensor(myLibrary.user, coordinator))
-        sensors.append(LoanOverdueSensor(myLibrary.user, coordinator))
+        sensors.append(LoanSensor(myLibrary, listen(CATEGORY_LOANS, CATEGORY_EREOLEN), attributeLimit))
+        sensors.append(LoanOverdueSensor(myLibrary, listen(CATEGORY_LOANS), attributeLimit))
 
     # Debts
     if True:  # new_data[CONF_SHOW_DEBTS]:
-        sensors.append(DebtSensor(myLibrary.user, coordinator))
+        sensors.append(DebtSensor(myLibrary, listen(CATEGORY_DEBTS), attributeLimit))
 
     # Reservations
     if True:  # new_data[CONF_SHOW_RESERVATIONS]:
-        sensors.append(ReservationSensor(myLibrary.user, coordinator))
-        sensors.append(ReservationReadySensor(myLibrary.user, coordinator))
+        sensors.append(ReservationSensor(myLibrary, listen(CATEGORY_RESERVATIONS, CATEGORY_EREOLEN), attributeLimit))
+        sensors.append(ReservationReadySensor(myLibrary, listen(CATEGORY_RESERVATIONS), attributeLimit))
+
+    # Summaries, so dashboards and automations do not loop over every material
+    sensors.append(NextDueSensor(myLibrary, listen(CATEGORY_LOANS, CATEGORY_EREOLEN)))
+    sensors.append(NextPickupSensor(myLibrary, listen(CATEGORY_RESERVATIONS)))
+
+    # One household sensor for all the accounts, added by the first account set up
+    # and handed to another loaded account when that one is unloaded
+    household = hass.data[DOMAIN].setdefault(DATA_HOUSEHOLD, {"owner": None, "adders": {}})
+    household["adders"][entry.entry_id] = async_add_entities
+    if household["owner"] is None:
+        household["owner"] = entry.entry_id
+        sensors.append(HouseholdSensor(hass))
+
+    @callback
+    def hand_over_household():
+        # Runs after the sensors of the entry are removed, so the sensor is not there twice
+        household["adders"].pop(entry.entry_id, None)
+        if household["owner"] == entry.entry_id:
+            household["owner"] = next(iter(household["adders"]), None)
+            if household["owner"] is not None:
+                household["adders"][household["owner"]]([HouseholdSensor(hass)])
+
+    entry.async_on_unload(hand_over_household)
+
+    # Diagnostics, when each category was last refreshed and how the calls to the library perform
+    sensors += [RefreshedSensor(myLibrary, coordinator) for coordinator in coordinators.values()]
+    sensors.append(RequestsSensor(myLibrary, list(coordinators.values())))
+    sensors.append(CacheSensor(myLibrary, list(coordinators.values())))
 
     async_add_entities(sensors)
 
+    async def first_refresh():
+        await orchestrator.async_refresh(first)
+        # Registered once refreshed, so the first scheduled refreshes of the accounts stay staggered
+        for coordinator in coordinators.values():
+            entry.async_on_unload(orchestrator.register(coordinator))
+
+    # The entities show the stored lists until the first refresh, which does not hold up the startup
+    entry.async_create_background_task(hass, first_refresh(), f"{DOMAIN} first refresh ({myLibrary.user.date})")
+
 
 def md5_unique_id(string):
     return hashlib.md5(string.encode("utf-8")).hexdigest()
 
 
-class LibrarySensor(SensorEntity):
+class LibraryBaseSensor(SensorEntity):
+    """Updated by the coordinators of the categories the sensor shows.
+
+    The attributes are built once per generation of the lists they show, and
+    the state is only written when a generation, the staleness or the
+    availability changed, not on every refresh of every coordinator.
+    """
+
+    # The lists of the user the attributes are built from, see AsyncLibrary.generations
+    lists: tuple[str, ...] = ()
+
+    def __init__(self, myLibrary: AsyncLibrary, coordinators: list[LibraryCoordinator]) -> None:
+        self.myLibrary = myLibrary
+        self.coordinators = coordinators
+        self._attributes = None
+        self._attributesKey = None
+        self._writtenKey = None
+
+    @property
+    def should_poll(self):
+        """No need to poll. Coordinator notifies entity of updates."""
+        return False
+
+    @property
+    def available(self):
+        """Return if entity is available, a failed refresh keeps showing the last data."""
+        # Any category with data, so the loans are shown while eReolen has never answered
+        return not self.coordinators or any(coordinator.hasData for coordinator in self.coordinators)
+
+    @property
+    def stale(self):
+        # A sensor of a category that is turned off has nothing to refresh
+        return any(self.myLibrary.isStale(coordinator.category) for coordinator in self.coordinators)
+
+    def _key(self):
+        # Changes whenever what the sensor shows changes
+        return (tuple(self.myLibrary.generations[name] for name in self.lists), self.stale, self.available)
+
+    def _buildAttributes(self):
+        return {}
+
+    @property
+    def extra_state_attributes(self):
+        key = self._key()
+        if self._attributes is None or key != self._attributesKey:
+            # No refresh time, it would change on every refresh, the age of the data is in the diagnostics
+            self._attributes = {**self._buildAttributes(), "stale": self.stale}
+            self._attributesKey = key
+        return self._attributes
+
+    @callback
+    def _handle_coordinator_update(self):
+        key = self._key()
+        if key != self._writtenKey:
+            self._writtenKey = key
+            self.async_write_ha_state()
+
+    async def async_update(self):
+        """Update the entity. Only used by the generic entity update service."""
+        for coordinator in self.coordinators:
+            await coordinator.async_request_refresh()
+
+    async def async_added_to_hass(self):
+        """When entity is added to hass."""
+        for coordinator in self.coordinators:
+            self.async_on_remove(
+                coordinator.async_add_listener(self._handle_coordinator_update)
+            )
+
+
+class LibrarySensor(LibraryBaseSensor):
+    lists = ('loans', 'loansOverdue', 'reservations', 'reservationsReady', 'debts', 'profile')
+
     def __init__(
         self,
-        myLibrary: Library,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
     ) -> None:
-        self.myLibrary = myLibrary
+        super().__init__(myLibrary, coordinators)
         self._name = f"{self.myLibrary.libraryName} ({self.myLibrary.user.name})"
         self._unique_id = md5_unique_id(
             self.myLibrary.libraryName + self.myLibrary.user.userId
         )
-        self.coordinator = coordinator
 
     @property
     def name(self):
@@ -108,6 +252,10 @@ class LibrarySensor(SensorEntity):
     def icon(self):
         return "mdi:library"
 
+    def _key(self):
+        # The days to the first return change at midnight
+        return (super()._key(), datetime.now().date())
+
     @property
     def state(self):
         if len(self.myLibrary.user.loans) > 0:
@@ -117,8 +265,7 @@ class LibrarySensor(SensorEntity):
                 ).days
         return ""
 
-    @property
-    def extra_state_attributes(self):
+    def _buildAttributes(self):
         attr = {
             "loans": len(self.myLibrary.user.loans),
             "loans_overdue": len(self.myLibrary.user.loansOverdue),
@@ -151,35 +298,53 @@ class LibrarySensor(SensorEntity):
     def unique_id(self):
         return self._unique_id
 
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
 
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+class LibraryListSensor(LibraryBaseSensor):
+    """Shows the first materials of a list and how many there are.
 
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
+    Only attributeLimit materials are put in the attributes, and they are left
+    out of the recorder, so a large account costs no more to record than a
+    small one. The whole list is served by the get_items service.
+    """
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
+    # The list shown, by its name in ITEM_LISTS
+    items: str = ""
 
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
+    ) -> None:
+        super().__init__(myLibrary, coordinators)
+        self.libraryUser = myLibrary.user
+        self.attributeLimit = attributeLimit
+
+    def _buildAttributes(self):
+        attribute, item = ITEM_LISTS[self.items]
+        objs = getattr(self.libraryUser, attribute)
+        shown = objs[:self.attributeLimit]
+        return {
+            "user": self.libraryUser.name,
+            self.items: [item(obj) for obj in shown],
+            "total": len(objs),
+            "shown": len(shown),
+            ATTR_ATTRIBUTION: CREDITS,
+        }
+
+
+class LoanSensor(LibraryListSensor):
+    lists = ('loans',)
+    items = "loans"
+    _unrecorded_attributes = frozenset({"loans"})
 
-class LoanSensor(SensorEntity):
     def __init__(
         self,
-        libraryUser: libraryUser,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
     ) -> None:
-        self.libraryUser = libraryUser
-        self.coordinator = coordinator
+        super().__init__(myLibrary, coordinators, attributeLimit)
         self._name = f"Bibliotekslån ({self.libraryUser.name})"
         self._unique_id = md5_unique_id("Loans_" + self.libraryUser.userId)
 
@@ -201,61 +366,23 @@ class LoanSensor(SensorEntity):
     def state(self):
         return len(self.libraryUser.loans)
 
-    @property
-    def extra_state_attributes(self):
-        attr = {"user": self.libraryUser.name}
-        loans = []
-        for loan in self.libraryUser.loans:
-            loans.append(
-                {
-                    "title": loan.title,
-                    "creators": loan.creators,
-                    "type": loan.type,
-                    "loan_date": loan.loanDate,
-                    "expire_date": loan.expireDate,
-                    "renewable": loan.renewAble,
-                    "order_id": loan.orderId,
-                    "url": loan.url,
-                    "cover": loan.coverUrl,
-                }
-            )
-        attr["loans"] = loans
-        attr[ATTR_ATTRIBUTION] = CREDITS
-        return attr
-
     @property
     def unique_id(self):
         return self._unique_id
 
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
 
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
+class LoanOverdueSensor(LibraryListSensor):
+    lists = ('loansOverdue',)
+    items = "loans_overdue"
+    _unrecorded_attributes = frozenset({"loans_overdue"})
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-
-class LoanOverdueSensor(SensorEntity):
     def __init__(
         self,
-        libraryUser: libraryUser,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
     ) -> None:
-        self.libraryUser = libraryUser
-        self.coordinator = coordinator
+        super().__init__(myLibrary, coordinators, attributeLimit)
         self._name = f"Bibliotekslån overskredet ({self.libraryUser.name})"
         self._unique_id = md5_unique_id("LoansOverdue_" + self.libraryUser.userId)
 
@@ -277,59 +404,23 @@ class LoanOverdueSensor(SensorEntity):
     def state(self):
         return len(self.libraryUser.loansOverdue)
 
-    @property
-    def extra_state_attributes(self):
-        attr = {"user": self.libraryUser.name}
-        loans_overdue = []
-        for loan_overdue in self.libraryUser.loansOverdue:
-            loans_overdue.append(
-                {
-                    "title": loan_overdue.title,
-                    "creators": loan_overdue.creators,
-                    "type": loan_overdue.type,
-                    "loan_date": loan_overdue.loanDate,
-                    "expire_date": loan_overdue.expireDate,
-                    "url": loan_overdue.url,
-                    "cover": loan_overdue.coverUrl,
-                }
-            )
-        attr["loans_overdue"] = loans_overdue
-        attr[ATTR_ATTRIBUTION] = CREDITS
-        return attr
-
     @property
     def unique_id(self):
         return self._unique_id
 
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
 
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
-
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
+class ReservationSensor(LibraryListSensor):
+    lists = ('reservations',)
+    items = "reservations"
+    _unrecorded_attributes = frozenset({"reservations"})
 
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-
-class ReservationSensor(SensorEntity):
     def __init__(
         self,
-        libraryUser: libraryUser,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
     ) -> None:
-        self.libraryUser = libraryUser
-        self.coordinator = coordinator
+        super().__init__(myLibrary, coordinators, attributeLimit)
         self._name = f"Reservationer ({self.libraryUser.name})"
         self._unique_id = md5_unique_id("Reservations_" + self.libraryUser.userId)
 
@@ -351,61 +442,23 @@ class ReservationSensor(SensorEntity):
     def state(self):
         return len(self.libraryUser.reservations)
 
-    @property
-    def extra_state_attributes(self):
-        attr = {"user": self.libraryUser.name}
-        reservations = []
-        for reservation in self.libraryUser.reservations:
-            reservations.append(
-                {
-                    "title": reservation.title,
-                    "creators": reservation.creators,
-                    "type": reservation.type,
-                    "queue_number": reservation.queueNumber,
-                    "created_date": reservation.createdDate,
-                    "expire_date": reservation.expireDate,
-                    "pickup_library": reservation.pickupLibrary,
-                    "url": reservation.url,
-                    "cover": reservation.coverUrl,
-                }
-            )
-        attr["reservations"] = reservations
-        attr[ATTR_ATTRIBUTION] = CREDITS
-        return attr
-
     @property
     def unique_id(self):
         return self._unique_id
 
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
 
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+class ReservationReadySensor(LibraryListSensor):
+    lists = ('reservationsReady',)
+    items = "reservations_ready"
+    _unrecorded_attributes = frozenset({"reservations_ready"})
 
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
-
-
-class ReservationReadySensor(SensorEntity):
     def __init__(
         self,
-        libraryUser: libraryUser,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
     ) -> None:
-        self.libraryUser = libraryUser
-        self.coordinator = coordinator
+        super().__init__(myLibrary, coordinators, attributeLimit)
         self._name = f"Reservationer klar ({self.libraryUser.name})"
         self._unique_id = md5_unique_id("ReservationsReady_" + self.libraryUser.userId)
 
@@ -427,61 +480,23 @@ class ReservationReadySensor(SensorEntity):
     def state(self):
         return len(self.libraryUser.reservationsReady)
 
-    @property
-    def extra_state_attributes(self):
-        attr = {"user": self.libraryUser.name}
-        reservationsReady = []
-        for reservationReady in self.libraryUser.reservationsReady:
-            reservationsReady.append(
-                {
-                    "title": reservationReady.title,
-                    "creators": reservationReady.creators,
-                    "type": reservationReady.type,
-                    "reservation_number": reservationReady.reservationNumber,
-                    "created_date": reservationReady.createdDate,
-                    "pickup_date": reservationReady.pickupDate,
-                    "pickup_library": reservationReady.pickupLibrary,
-                    "url": reservationReady.url,
-                    "cover": reservationReady.coverUrl,
-                }
-            )
-        attr["reservations_ready"] = reservationsReady
-        attr[ATTR_ATTRIBUTION] = CREDITS
-        return attr
-
     @property
     def unique_id(self):
         return self._unique_id
 
-    @property
-    def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
-        return False
-
-    @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
-
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
-
-    async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
 
+class DebtSensor(LibraryListSensor):
+    lists = ('debts',)
+    items = "debts"
+    _unrecorded_attributes = frozenset({"debts"})
 
-class DebtSensor(SensorEntity):
     def __init__(
         self,
-        libraryUser: libraryUser,
-        coordinator: DataUpdateCoordinator,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+        attributeLimit: int = ATTRIBUTE_LIMIT,
     ) -> None:
-        self.libraryUser = libraryUser
-        self.coordinator = coordinator
+        super().__init__(myLibrary, coordinators, attributeLimit)
         self._name = f"Gebyrer ({self.libraryUser.name})"
         self._unique_id = md5_unique_id("Debts_" + self.libraryUser.userId)
 
@@ -504,45 +519,283 @@ class DebtSensor(SensorEntity):
         return self.libraryUser.debtsAmount
 
     @property
-    def extra_state_attributes(self):
-        attr = {"user": self.libraryUser.name}
-        debts = []
-        for debt in self.libraryUser.debts:
-            debts.append(
-                {
-                    "title": debt.title,
-                    "type": debt.type,
-                    "fee_date": debt.feeDate,
-                    "fee_type": debt.feeType,
-                    "fee_amount": debt.feeAmount,
-                    "url": debt.url,
-                    "cover": debt.coverUrl,
-                }
-            )
-        attr["debts"] = debts
-        attr[ATTR_ATTRIBUTION] = CREDITS
-        return attr
+    def unique_id(self):
+        return self._unique_id
+
+
+class NextDueSensor(LibraryBaseSensor):
+    lists = ('loans', 'loansOverdue')
+    _attr_device_class = SensorDeviceClass.DATE
+
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+    ) -> None:
+        super().__init__(myLibrary, coordinators)
+        self._name = f"Næste aflevering ({self.myLibrary.user.name})"
+        self._unique_id = md5_unique_id("NextDue_" + self.myLibrary.user.userId)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return "mdi:calendar-clock"
+
+    def _key(self):
+        # The counts of loans due within some days change at midnight
+        return (super()._key(), date.today())
+
+    @property
+    def native_value(self):
+        return self.myLibrary.summary()["next_due"]
+
+    def _buildAttributes(self):
+        summary = self.myLibrary.summary()
+        return {
+            "user": self.myLibrary.user.name,
+            **{key: value for key, value in summary.items() if key.startswith("due_within_")},
+            "overdue_count": summary["overdue_count"],
+            "loan_count": summary["loan_count"],
+            ATTR_ATTRIBUTION: CREDITS,
+        }
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+
+class NextPickupSensor(LibraryBaseSensor):
+    lists = ('reservationsReady',)
+    _attr_device_class = SensorDeviceClass.DATE
+
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+    ) -> None:
+        super().__init__(myLibrary, coordinators)
+        self._name = f"Næste afhentning ({self.myLibrary.user.name})"
+        self._unique_id = md5_unique_id("NextPickup_" + self.myLibrary.user.userId)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return "mdi:calendar-arrow-right"
+
+    def _key(self):
+        # A pickup date passing at midnight leaves the summary
+        return (super()._key(), date.today())
+
+    @property
+    def native_value(self):
+        return self.myLibrary.summary()["next_pickup"]
+
+    def _buildAttributes(self):
+        summary = self.myLibrary.summary()
+        return {
+            "user": self.myLibrary.user.name,
+            "ready_count": summary["ready_count"],
+            ATTR_ATTRIBUTION: CREDITS,
+        }
 
     @property
     def unique_id(self):
         return self._unique_id
 
+
+class HouseholdSensor(SensorEntity):
+    """The summaries of all the accounts added up, with the loans of the household as state."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._name = "Bibliotek husstand"
+        self._unique_id = md5_unique_id("Household")
+        self._summaryValue = None
+        self._summaryKey = None
+        self._writtenKey = None
+
     @property
     def should_poll(self):
-        """No need to poll. Coordinator notifies entity of updates."""
         return False
 
     @property
-    def available(self):
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+    def name(self):
+        return self._name
 
-    async def async_update(self):
-        """Update the entity. Only used by the generic entity update service."""
-        await self.coordinator.async_request_refresh()
+    @property
+    def icon(self):
+        return "mdi:home-group"
+
+    def _key(self):
+        # Changes when an account is added or removed, a list of any account changes, or the day changes
+        return (
+            tuple(
+                (entryId, tuple(myLibrary.generations.values()))
+                for entryId, myLibrary in sorted(async_get_libraries(self.hass).items())
+            ),
+            date.today(),
+        )
+
+    def _summary(self):
+        key = self._key()
+        if self._summaryValue is None or key != self._summaryKey:
+            self._summaryValue = combine([myLibrary.summary() for myLibrary in async_get_libraries(self.hass).values()])
+            self._summaryKey = key
+        return self._summaryValue
+
+    @property
+    def state(self):
+        summary = self._summary()
+        return summary["loan_count"] + summary["overdue_count"]
+
+    @property
+    def extra_state_attributes(self):
+        summary = self._summary()
+        return {
+            **{key: iso(value) if key in ("next_due", "next_pickup") else value for key, value in summary.items()},
+            ATTR_ATTRIBUTION: CREDITS,
+        }
+
+    @callback
+    def _handle_update(self):
+        key = self._key()
+        if key != self._writtenKey:
+            self._writtenKey = key
+            self.async_write_ha_state()
 
     async def async_added_to_hass(self):
-        """When entity is added to hass."""
-        self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
-        )
+        self.async_on_remove(async_dispatcher_connect(self.hass, SIGNAL_UPDATED, self._handle_update))
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+
+class RefreshedSensor(LibraryBaseSensor):
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinator: LibraryCoordinator,
+    ) -> None:
+        super().__init__(myLibrary, [coordinator])
+        self.category = coordinator.category
+        self._name = f"Bibliotek {CATEGORY_NAMES[self.category]} opdateret ({self.myLibrary.user.name})"
+        self._unique_id = md5_unique_id(f"Refreshed_{self.category}_" + self.myLibrary.user.userId)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return "mdi:update"
+
+    def _key(self):
+        # Written once per successful refresh of the category, and when it becomes stale
+        return (self.myLibrary.refreshedAt(self.category), self.stale, self.available)
+
+    @property
+    def native_value(self):
+        # Taken with datetime.now(), so in the local time of the system
+        updated = self.myLibrary.refreshedAt(self.category)
+        return updated.astimezone() if updated else None
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+
+class RequestsSensor(LibraryBaseSensor):
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # Written on every refresh, so only the count is recorded
+    _unrecorded_attributes = frozenset({"endpoints"})
+
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+    ) -> None:
+        super().__init__(myLibrary, coordinators)
+        self._name = f"Bibliotek forespørgsler ({self.myLibrary.user.name})"
+        self._unique_id = md5_unique_id("Requests_" + self.myLibrary.user.userId)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return "mdi:timer-outline"
+
+    @property
+    def state(self):
+        return self.myLibrary.metrics.requests
+
+    def _key(self):
+        return self.myLibrary.metrics.requests
+
+    @property
+    def extra_state_attributes(self):
+        # Count, errors, retries, bytes and latency of each endpoint
+        return {
+            "endpoints": self.myLibrary.metrics.summary(),
+            ATTR_UNIT_OF_MEASUREMENT: "requests",
+        }
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+
+class CacheSensor(LibraryBaseSensor):
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # The stats of each kind, see MetadataCache.stats
+    _unrecorded_attributes = frozenset({CACHE_AGENCIES, CACHE_DETAILS, CACHE_PRODUCTS})
+
+    def __init__(
+        self,
+        myLibrary: AsyncLibrary,
+        coordinators: list[LibraryCoordinator],
+    ) -> None:
+        super().__init__(myLibrary, coordinators)
+        self._name = f"Bibliotek cache ({self.myLibrary.user.name})"
+        self._unique_id = md5_unique_id("Cache_" + self.myLibrary.user.userId)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return "mdi:database-clock-outline"
+
+    @property
+    def state(self):
+        # Share of the lookups answered by the cache, shared by all accounts
+        stats = self.myLibrary.cache.stats().values()
+        hits = sum(kind["hits"] for kind in stats)
+        lookups = hits + sum(kind["misses"] for kind in stats)
+        return round(100 * hits / lookups) if lookups else None
+
+    def _key(self):
+        return tuple((kind["hits"], kind["misses"], kind["entries"]) for kind in self.myLibrary.cache.stats().values())
+
+    @property
+    def extra_state_attributes(self):
+        return {
+            **self.myLibrary.cache.stats(),
+            ATTR_UNIT_OF_MEASUREMENT: "%",
+        }
+
+    @property
+    def unique_id(self):
+        return self._unique_id
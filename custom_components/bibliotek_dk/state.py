@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    STATE_SAVE_DELAY,
+    STATE_STORAGE_VERSION,
+)
+from .library_api import AsyncLibrary
+
+
+class StateManager:
+    """Persists the profile and lists of an account, and restores them at startup.
+
+    The sensors are set up from the restored lists right away and show them as
+    stale, so Home Assistant does not wait for the library servers. The first
+    refresh runs in the background.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, myLibrary: AsyncLibrary) -> None:
+        self.myLibrary = myLibrary
+        self._store = Store(hass, STATE_STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.state")
+
+    async def async_load(self):
+        self.myLibrary.restoreState(await self._store.async_load())
+        self.myLibrary.onState = self._state_changed
+
+    @callback
+    def async_stop(self):
+        self.myLibrary.onState = None
+
+    @callback
+    def _state_changed(self):
+        self._store.async_delay_save(lambda: self.myLibrary.storedState, STATE_SAVE_DELAY)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import datetime
+import logging
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    TOKEN_REFRESH_MARGIN,
+    TOKEN_RETRY,
+    TOKEN_STORAGE_VERSION,
+)
+from .library_api import AsyncLibrary
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenManager:
+    """Persists the tokens of an account and renews them before they expire.
+
+    A restart reuses the stored tokens instead of logging in, and the login is
+    done in the background a margin before the assumed expiry, so updates never
+    wait for it.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, myLibrary: AsyncLibrary) -> None:
+        self.hass = hass
+        self.myLibrary = myLibrary
+        self._store = Store(hass, TOKEN_STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.tokens")
+        self._unsub = None
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        self.myLibrary.restoreTokens(data)
+        self.myLibrary.onTokens = self._tokens_changed
+        if data is None and self.myLibrary.tokenExpires > datetime.now():
+            # Logged in by the config flow, keep those tokens
+            self._tokens_changed()
+        else:
+            self._schedule()
+
+    @callback
+    def async_stop(self):
+        self.myLibrary.onTokens = None
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _tokens_changed(self):
+        self._store.async_delay_save(lambda: self.myLibrary.tokens, 1)
+        self._schedule()
+
+    @callback
+    def _schedule(self, retry: bool = False):
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        if retry:
+            delay = TOKEN_RETRY.total_seconds()
+        elif self.myLibrary.tokenExpires <= datetime.now():
+            # Without a token the next update logs in, which schedules the renewal
+            return
+        else:
+            delay = max((self.myLibrary.tokenExpires - TOKEN_REFRESH_MARGIN - datetime.now()).total_seconds(), 0)
+        self._unsub = async_call_later(self.hass, delay, self._refresh)
+
+    async def _refresh(self, _now=None):
+        self._unsub = None
+        _LOGGER.debug("(%s) renewing the tokens", self.myLibrary.user.date)
+        try:
+            renewed = await self.myLibrary.refreshTokens()
+        except Exception as err:
+            # Retried whatever went wrong, or the next update would have to login
+            _LOGGER.debug("(%s) renewing the tokens failed: %s", self.myLibrary.user.date, err)
+            renewed = False
+        if not renewed:
+            _LOGGER.warning("(%s) could not renew the tokens, retrying in %s", self.myLibrary.user.date, TOKEN_RETRY)
+            self._schedule(retry=True)
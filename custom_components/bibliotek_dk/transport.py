@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from urllib.parse import urlsplit
+import aiohttp
+import asyncio
+import json
+import logging
+import random
+import ssl
+import time
+
+from .const import (
+    HEADERS,
+    TRANSPORT_BACKOFF,
+    TRANSPORT_BACKOFF_MAX,
+    TRANSPORT_BREAKER_FAILURES,
+    TRANSPORT_BREAKER_RESET,
+    TRANSPORT_CONNECT_TIMEOUT,
+    TRANSPORT_KEEPALIVE,
+    TRANSPORT_LIMIT,
+    TRANSPORT_LIMIT_PER_HOST,
+    TRANSPORT_RATE_BURST,
+    TRANSPORT_RATE_PER_HOST,
+    TRANSPORT_READ_TIMEOUT,
+    TRANSPORT_RETRIES,
+    TRANSPORT_TOTAL_TIMEOUT,
+)
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class UpstreamError(aiohttp.ClientError):
+    """A library server did not give a usable answer."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The host failed too often lately, so the request was not sent."""
+
+
+class ApiResponse:
+    """The parts of a HTTP response we use, read while the connection is open."""
+
+    def __init__(self, status: int, url: str, text: str, size: int | None = None, retryAfter: str | None = None) -> None:
+        self.status = status
+        self.url = url
+        self.text = text
+        # Bytes received, and the Retry-After header of a 429 or 503
+        self.size = len(text) if size is None else size
+        self.retryAfter = retryAfter
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status != 200:
+            raise UpstreamError(f"{self.url} returned {self.status}")
+        return self
+
+
+class CircuitBreaker:
+    """Fails fast while a host is down, letting a single request probe it now and then."""
+
+    def __init__(self, threshold: int, reset: float) -> None:
+        self._threshold = threshold
+        self._reset = reset
+        self._failures = 0
+        self._openUntil = 0.0
+
+    def allow(self):
+        if self._failures < self._threshold:
+            return True
+        now = time.monotonic()
+        if now < self._openUntil:
+            return False
+        # Half open, this request probes the host while the others keep failing fast
+        self._openUntil = now + self._reset
+        return True
+
+    def success(self):
+        self._failures = 0
+
+    def failure(self):
+        self._failures += 1
+        if self._failures >= self._threshold:
+            self._openUntil = time.monotonic() + self._reset
+
+
+class RateLimiter:
+    """A token bucket per host, shared by all accounts."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        # host -> [tokens, last refill]
+        self._buckets = {}
+
+    async def acquire(self, host):
+        bucket = self._buckets.setdefault(host, [self._burst, time.monotonic()])
+        while True:
+            now = time.monotonic()
+            bucket[0] = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            await asyncio.sleep((1 - bucket[0]) / self._rate)
+
+
+class LibraryTransport:
+    """The connection pool of the integration, shared by all accounts.
+
+    Every account gets its own session from session(), so cookies never leak
+    between accounts, while the TLS connections to the library servers are kept
+    alive and reused by all of them.
+
+    Every request has a timeout, 5xx and 429 answers and connection errors are
+    retried a few times with a jittered back-off, and a host failing again and
+    again is left alone for a while, so an outage gives stale data fast.
+    """
+
+    def __init__(
+        self, sslContext: ssl.SSLContext | None = None, limit: int = TRANSPORT_LIMIT,
+        limitPerHost: int = TRANSPORT_LIMIT_PER_HOST, keepalive: float = TRANSPORT_KEEPALIVE,
+        ratePerHost: float = TRANSPORT_RATE_PER_HOST, rateBurst: int = TRANSPORT_RATE_BURST,
+        retries: int = TRANSPORT_RETRIES, baseUrl: str | None = None,
+    ) -> None:
+        self._connector = aiohttp.TCPConnector(
+            ssl=sslContext if sslContext is not None else True,
+            limit=limit,
+            limit_per_host=limitPerHost,
+            keepalive_timeout=keepalive,
+            ttl_dns_cache=300,
+        )
+        # Requests per second to each upstream host, across all accounts
+        self._limiter = RateLimiter(ratePerHost, rateBurst)
+        self._retries = retries
+        # host -> CircuitBreaker
+        self._breakers = {}
+        self._timeout = aiohttp.ClientTimeout(
+            total=TRANSPORT_TOTAL_TIMEOUT,
+            connect=TRANSPORT_CONNECT_TIMEOUT,
+            sock_read=TRANSPORT_READ_TIMEOUT,
+        )
+        # Every request goes to this server instead, keeping the path, used to run against a local stand-in
+        self._baseUrl = baseUrl.rstrip('/') if baseUrl else None
+
+    def session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=self._connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(),
+            headers=HEADERS,
+            timeout=self._timeout,
+        )
+
+    async def request(
+        self, session: aiohttp.ClientSession, method, url, metrics: Metrics | None = None, endpoint=None, **kwargs
+    ) -> ApiResponse:
+        # The calls are recorded in metrics under endpoint, or the host when not named
+        host = urlsplit(url).hostname
+        endpoint = endpoint or host
+        breaker = self._breakers.setdefault(host, CircuitBreaker(TRANSPORT_BREAKER_FAILURES, TRANSPORT_BREAKER_RESET))
+        if not breaker.allow():
+            if metrics:
+                metrics.rejected(endpoint)
+            raise CircuitOpenError(f"{host} is failing, not sending {method} {url}")
+        attempt = 0
+        while True:
+            await self._limiter.acquire(host)
+            start = time.monotonic()
+            try:
+                response = await self._send(session, method, url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if metrics:
+                    metrics.record(endpoint, time.monotonic() - start, error=True)
+                if attempt >= self._retries:
+                    breaker.failure()
+                    raise
+                delay = self._backoff(attempt)
+                _LOGGER.debug("%s %s failed (%r), retrying in %.1fs", method, url, err, delay)
+            else:
+                if metrics:
+                    metrics.record(endpoint, time.monotonic() - start, response.size, error=response.status >= 400)
+                if response.status < 500 and response.status != 429:
+                    breaker.success()
+                    return response
+                if attempt >= self._retries:
+                    breaker.failure()
+                    return response
+                delay = self._backoff(attempt, response.retryAfter)
+                _LOGGER.debug("%s %s returned %s, retrying in %.1fs", method, url, response.status, delay)
+            if metrics:
+                metrics.retry(endpoint)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, session: aiohttp.ClientSession, method, url, **kwargs) -> ApiResponse:
+        # A single try, overridden to record or replay the answers
+        if self._baseUrl:
+            url = self._baseUrl + urlsplit(url)._replace(scheme='', netloc='').geturl()
+        # The body is read before the connection is released to the pool
+        async with session.request(method, url, **kwargs) as res:
+            body = await res.read()
+            return ApiResponse(res.status, str(res.url), await res.text(), len(body), res.headers.get('Retry-After'))
+
+    @staticmethod
+    def _backoff(attempt, retryAfter=None):
+        # Full jitter, so the accounts retrying after the same failure do not retry together
+        delay = random.uniform(0, min(TRANSPORT_BACKOFF_MAX, TRANSPORT_BACKOFF * 2 ** attempt))
+        if retryAfter and retryAfter.isdigit():
+            # A 429 or 503 may say how long to wait
+            delay = max(delay, min(float(retryAfter), TRANSPORT_BACKOFF_MAX))
+        return delay
+
+    async def close(self):
+        await self._connector.close()